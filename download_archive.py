@@ -0,0 +1,98 @@
+import os
+import sqlite3
+import threading
+import time
+from info_cache import canonical_key
+
+# 默认归档文件，位于仓库根目录，音频和视频下载脚本共享
+ARCHIVE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.download_archive.sqlite')
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS downloads (
+    video_key TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    format TEXT,
+    path TEXT NOT NULL,
+    completed REAL NOT NULL,
+    PRIMARY KEY (video_key, kind)
+);
+'''
+
+
+class DownloadArchive:
+    """已完成下载的归档
+
+    按 (视频, 类型) 记录下载格式和输出文件，类型如 'video'、'audio'（任意音频容器）或
+    'audio-mp3'（按实际输出容器区分）。视频由
+    info_cache.canonical_key 从 URL 直接得到，不需要联网，命中时可以跳过解析和下载。
+    记录保存在 SQLite 中（WAL 模式），多个进程可以同时读写；首次查询时全部读入内存，
+    之后的查询只是一次字典查找，内存中没有或格式不同的再到数据库中确认一次（可能刚被其他进程写入）。
+    """
+
+    def __init__(self, archive_file=ARCHIVE_FILE):
+        self.archive_file = archive_file
+        self._conn = None
+        self._entries = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.archive_file, timeout=30, check_same_thread=False)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.executescript(_SCHEMA)
+        return self._conn
+
+    def _row_entry(self, row):
+        video_key, kind, fmt, path, completed = row
+        return {'video_key': video_key, 'kind': kind, 'format': fmt, 'path': path, 'completed': completed}
+
+    def get(self, url, kind, fmt=None):
+        """返回已完成的下载记录，没有记录、格式不同或文件已不存在时返回 None"""
+        key = (canonical_key(url), kind)
+        with self._lock:
+            conn = self._connect()
+            if self._entries is None:
+                self._entries = {
+                    row[:2]: self._row_entry(row)
+                    for row in conn.execute('SELECT video_key, kind, format, path, completed FROM downloads')
+                }
+            entry = self._entries.get(key)
+            if entry is None or (fmt and entry['format'] != fmt):
+                row = conn.execute(
+                    'SELECT video_key, kind, format, path, completed FROM downloads WHERE video_key = ? AND kind = ?',
+                    key
+                ).fetchone()
+                if row is None:
+                    self._entries.pop(key, None)
+                    return None
+                entry = self._entries[key] = self._row_entry(row)
+
+        if fmt and entry['format'] != fmt:
+            return None
+        if not os.path.exists(entry['path']):
+            return None
+        return entry
+
+    def record(self, url, kind, path, fmt=None):
+        """记录一次完成的下载，同一视频同一类型只保留最新的记录"""
+        entry = {
+            'video_key': canonical_key(url),
+            'kind': kind,
+            'format': fmt,
+            'path': os.path.abspath(path),
+            'completed': time.time()
+        }
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.execute(
+                    'INSERT OR REPLACE INTO downloads (video_key, kind, format, path, completed) VALUES (?, ?, ?, ?, ?)',
+                    (entry['video_key'], kind, fmt, entry['path'], entry['completed'])
+                )
+            if self._entries is not None:
+                self._entries[(entry['video_key'], kind)] = entry
+        return entry
+
+
+# 所有入口共享的默认归档
+download_archive = DownloadArchive()
@@ -1,71 +1,392 @@
 import sys
+import io
 import os
+import queue
+import threading
+import time
 import yt_dlp
 import subprocess
+from yt_dlp.networking import Request
+from info_cache import info_cache
+from download_archive import download_archive
+from download_progress import download_progress, forward_events
+from job_queue import JobQueue, run_workers
+
+COOKIES_PATH = 'www.youtube.com_cookies.txt'
+# 任务队列中音频下载任务的队列名
+QUEUE_NAME = 'audio'
+
+
+# 可以直接复制音频流（不重新编码）的编码及对应的容器扩展名
+# 只想要 mp3 时可以只保留 'mp3'，其他编码都会重新编码为 mp3
+COPY_CONTAINERS = {
+    'mp3': '.mp3',
+    'aac': '.m4a',
+    'opus': '.opus',
+}
+
+# 指定输出格式时（流式转码及其退回的两步流程）的扩展名和 ffmpeg 编码参数
+STREAM_OUTPUTS = {
+    'mp3': ('.mp3', ["-codec:a", "libmp3lame", "-b:a", "192k"]),
+    # 语音识别常用的 16kHz 单声道 PCM
+    'wav': ('.wav', ["-codec:a", "pcm_s16le", "-ac", "1", "-ar", "16000"]),
+}
+
+
+def normalize_acodec(acodec):
+    """
+    将 yt-dlp 的 acodec（如 mp4a.40.2）或 ffprobe 的编码名统一为 mp3 / aac / opus 等
+    """
+
+    if not acodec or acodec == 'none':
+        return None
+    acodec = acodec.lower()
+    # mp4a.6b / mp4a.69 是 MP4 容器中的 MP3，要在 mp4a 前缀之前判断
+    if acodec in ('mp3', 'mp4a.6b', 'mp4a.69'):
+        return 'mp3'
+    if acodec.startswith('mp4a') or acodec == 'aac':
+        return 'aac'
+    return acodec.split('.')[0]
 
 
-def need_convert_to_mp3(filepath):
+def probe_audio_codec(filepath):
     """
-    判断是否需要转 MP3
+    用 ffprobe 读取第一条音频流的编码，失败时返回 None
     """
 
-    ext = os.path.splitext(filepath)[1].lower()
+    cmd = [
+        "ffprobe",
+        "-v", "error",
+        "-select_streams", "a:0",
+        "-show_entries", "stream=codec_name",
+        "-of", "default=noprint_wrappers=1:nokey=1",
+        filepath
+    ]
+    try:
+        process = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    except OSError:
+        return None
+    if process.returncode:
+        return None
+    return normalize_acodec(process.stdout.decode('utf-8', 'replace').strip())
 
-    # 已经是 mp3，不需要转
-    if ext == '.mp3':
-        return False
 
-    # m4a 默认也不转（你可以改成 True）
-    if ext == '.m4a':
-        return False
+def plan_conversion(filepath, acodec=None):
+    """
+    根据实际音频编码决定处理方式，返回 (方式, 输出文件)
+
+    方式为 'keep'（直接使用）、'copy'（只换容器，复制音频流）或 'encode'（重新编码为 mp3）。
+    acodec 为下载信息中的编码，没有时用 ffprobe 检测；都无法确定时按扩展名判断。
+    """
+
+    base, ext = os.path.splitext(filepath)
+    ext = ext.lower()
+    codec = normalize_acodec(acodec) or probe_audio_codec(filepath)
 
-    # 其他全部转
-    return True
+    if codec is None:
+        # 无法确定编码：mp3 / m4a 直接使用，其他全部转
+        if ext in ('.mp3', '.m4a'):
+            return 'keep', filepath
+        return 'encode', base + ".mp3"
 
+    container = COPY_CONTAINERS.get(codec)
+    if container is None:
+        return 'encode', base + ".mp3"
+    if ext == container:
+        return 'keep', filepath
+    return 'copy', base + container
 
-def convert_to_mp3(input_file):
+
+def need_convert_to_mp3(filepath, acodec=None):
     """
-    ffmpeg 转 mp3（带进度）
+    判断是否需要转码（包括只换容器）
     """
 
-    output_file = os.path.splitext(input_file)[0] + ".mp3"
+    return plan_conversion(filepath, acodec)[0] != 'keep'
+
+
+def _parse_number(value, suffix=''):
+    """
+    解析 ffmpeg 进度中的数值，如 '1.52x'、'128.0kbits/s'，N/A 返回 None
+    """
+
+    if value is None:
+        return None
+    value = value.strip()
+    if suffix and value.endswith(suffix):
+        value = value[:-len(suffix)]
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+def parse_ffmpeg_progress(lines):
+    """
+    解析 ffmpeg -progress 的输出，每个进度块生成一个事件
+
+    {'encoded_seconds': 已编码的媒体时长, 'speed': 相对实时的倍数, 'bitrate': kbit/s,
+     'total_size': 已输出字节数, 'done': 是否结束}，无法得到的值为 None
+    """
+
+    block = {}
+    for line in lines:
+        key, sep, value = line.strip().partition('=')
+        if not sep:
+            continue
+        block[key] = value
+        if key != 'progress':
+            continue
+        out_time_us = _parse_number(block.get('out_time_us') or block.get('out_time_ms'))
+        total_size = _parse_number(block.get('total_size'))
+        yield {
+            'encoded_seconds': out_time_us / 1e6 if out_time_us is not None else None,
+            'speed': _parse_number(block.get('speed'), 'x'),
+            'bitrate': _parse_number(block.get('bitrate'), 'kbits/s'),
+            'total_size': int(total_size) if total_size is not None else None,
+            'done': value == 'end'
+        }
+        block = {}
+
+
+def _transcode_status(event, filename, duration, elapsed):
+    """
+    将进度事件转换为与 yt-dlp 进度回调相同形式的字典，status 为 transcoding / transcoded
+    """
+
+    encoded = event['encoded_seconds']
+    speed = event['speed']
+    status = dict(event, status='transcoded' if event['done'] else 'transcoding',
+                  filename=filename, total_seconds=duration, elapsed=elapsed)
+    status['_percent_str'] = f"{min(encoded / duration * 100, 100):5.1f}%" if duration and encoded is not None else ''
+    status['_speed_str'] = f"{speed:.2f}x" if speed else ''
+    status['_eta_str'] = ''
+    if duration and speed and encoded is not None:
+        eta_seconds = int(max(duration - encoded, 0) / speed)
+        status['_eta_str'] = f"{eta_seconds // 60:02d}:{eta_seconds % 60:02d}"
+    return status
+
+
+def _read_progress(stream, filename, duration, start, progress_hooks, last_event):
+    """
+    读取 ffmpeg 进度输出并调用回调，最后一个事件保存在 last_event 中
+    """
+
+    for event in parse_ffmpeg_progress(io.TextIOWrapper(stream, encoding='utf-8', errors='replace')):
+        last_event.update(event)
+        if progress_hooks:
+            status = _transcode_status(event, filename, duration, time.perf_counter() - start)
+            for hook in progress_hooks:
+                hook(status)
+
+
+def _run_ffmpeg(input_file, output_file, codec_args, threads=0, progress_hooks=(), duration=None):
+    """
+    运行 ffmpeg，返回 {'success', 'input', 'output', 'returncode', 'elapsed', 'error',
+    'encoded_seconds', 'speed'}
+
+    ffmpeg 的进度通过 -progress 输出，解析后交给 progress_hooks，duration 为媒体时长，用于计算百分比。
+    """
 
     cmd = [
         "ffmpeg",
         "-y",
+        "-hide_banner",
+        "-loglevel", "error",
+        "-nostats",
+        "-progress", "pipe:1",
         "-i", input_file,
         "-vn",
-        "-codec:a", "libmp3lame",
-        "-b:a", "192k",
+        *codec_args,
+        "-threads", str(threads),
         output_file
     ]
 
-    print(f"\n开始转码: {input_file} → {output_file}")
+    start = time.perf_counter()
+    last_event = {}
+    try:
+        process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    except OSError as e:
+        # 找不到 ffmpeg 等情况
+        returncode, error = None, str(e)
+    else:
+        # stderr 在后台读取，避免 ffmpeg 输出过多时阻塞
+        stderr_chunks = []
+        stderr_thread = threading.Thread(target=lambda: stderr_chunks.append(process.stderr.read()), daemon=True)
+        stderr_thread.start()
+        _read_progress(process.stdout, output_file, duration, start, progress_hooks, last_event)
+        returncode = process.wait()
+        stderr_thread.join()
+        error = b''.join(stderr_chunks).decode('utf-8', 'replace').strip()[-2000:] if returncode else None
+    elapsed = time.perf_counter() - start
+
+    speed = last_event.get('speed')
+    if returncode == 0:
+        print(f"\n转码完成: {output_file} ({elapsed:.1f}秒" + (f"，{speed:.1f}x" if speed else '') + ")")
+    else:
+        print(f"\n转码失败: {input_file} (返回码 {returncode})\n{error}")
+
+    return {
+        'success': returncode == 0,
+        'input': input_file,
+        'output': output_file,
+        'returncode': returncode,
+        'elapsed': elapsed,
+        'error': error,
+        'encoded_seconds': last_event.get('encoded_seconds'),
+        'speed': speed
+    }
+
 
-    subprocess.run(cmd)
+def convert_to_mp3(input_file, threads=0, progress_hooks=(), duration=None):
+    """
+    ffmpeg 转 mp3（带进度）
 
-    print("转码完成")
+    threads 为 ffmpeg 使用的线程数，0 表示由 ffmpeg 自动决定。
+    进度事件交给 progress_hooks（status 为 transcoding / transcoded），duration 为媒体时长。
+    返回 {'success', 'input', 'output', 'returncode', 'elapsed', 'error', 'encoded_seconds', 'speed'}
+    """
 
+    output_file = os.path.splitext(input_file)[0] + ".mp3"
 
-def download_audio(url, cookies_path=None, fmt='bestaudio'):
+    print(f"\n开始转码: {input_file} → {output_file}")
+
+    return _run_ffmpeg(input_file, output_file, ["-codec:a", "libmp3lame", "-b:a", "192k"],
+                       threads, progress_hooks, duration)
+
+
+def convert_audio(input_file, acodec=None, threads=0, progress_hooks=(), duration=None, output_format=None):
     """
-    下载音频 + 判断是否转码
+    按实际编码处理音频：能只换容器时直接复制音频流，否则重新编码为 mp3
+
+    output_format 为 STREAM_OUTPUTS 中的格式时，输出一定是该格式：
+    直接使用或复制音频流得不到该容器时，按该格式的编码参数重新编码。
+    返回结果与 convert_to_mp3 相同，另加 'mode'（keep / copy / encode）
     """
 
-    os.makedirs("audios", exist_ok=True)
+    mode, output_file = plan_conversion(input_file, acodec)
 
-    downloaded_file = {"path": None}
+    if output_format:
+        ext, codec_args = STREAM_OUTPUTS[output_format]
+        if os.path.splitext(output_file)[1].lower() != ext:
+            mode = 'encode'
+            output_file = os.path.splitext(input_file)[0] + ext
+            print(f"\n开始转码: {input_file} → {output_file}")
+            result = _run_ffmpeg(input_file, output_file, codec_args, threads, progress_hooks, duration)
+            result['mode'] = mode
+            return result
 
-    def hook(d):
-        if d['status'] == 'finished':
-            downloaded_file['path'] = d['filename']
-            print(f"\n下载完成: {d['filename']}")
+    if mode == 'keep':
+        print("无需转码，直接使用原音频")
+        result = {'success': True, 'input': input_file, 'output': input_file,
+                  'returncode': 0, 'elapsed': 0, 'error': None, 'encoded_seconds': None, 'speed': None}
+    elif mode == 'copy':
+        print(f"\n复制音频流: {input_file} → {output_file}")
+        result = _run_ffmpeg(input_file, output_file, ["-map", "0:a:0", "-codec:a", "copy"],
+                             threads, progress_hooks, duration)
+    else:
+        result = convert_to_mp3(input_file, threads, progress_hooks, duration)
+
+    result['mode'] = mode
+    return result
+
+
+class TranscodePool:
+    """
+    转码工作池
+
+    下载完成的文件通过 submit 放入队列，workers 个工作线程各自取出文件调用 ffmpeg（convert_audio），
+    下载和转码可以同时进行。threads_per_job 为每个 ffmpeg 进程的线程数。
+    progress_hooks 接收每个任务的转码进度事件。
+    close() 等待所有任务完成，返回每个任务的结果（与 convert_to_mp3 相同）。
+    """
+
+    def __init__(self, workers=None, threads_per_job=1, progress_hooks=()):
+        self.workers = workers or os.cpu_count() or 1
+        self.threads_per_job = threads_per_job
+        self.progress_hooks = list(progress_hooks)
+        self.results = []
+        self._closed = False
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._threads = [
+            threading.Thread(target=self._worker, name=f"transcode-{i + 1}", daemon=True)
+            for i in range(self.workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            # 出错或被中断时不再转码队列中剩余的文件
+            self.cancel()
+        self.close()
+
+    def cancel(self):
+        """丢弃还没有开始转码的文件，返回丢弃的数量"""
+        cancelled = 0
+        while True:
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                return cancelled
+            cancelled += 1
+
+    def submit(self, input_file, acodec=None, duration=None, on_success=None, on_failure=None, output_format=None):
+        """
+        加入转码队列，acodec 和 duration 为下载信息中的音频编码和时长，
+        on_success / on_failure 在转码成功 / 失败后以结果为参数调用（在工作线程中），
+        output_format 见 convert_audio
+        """
+        self._queue.put((input_file, acodec, duration, on_success, on_failure, output_format))
+
+    def _worker(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            input_file, acodec, duration, on_success, on_failure, output_format = job
+            try:
+                result = convert_audio(input_file, acodec, self.threads_per_job, self.progress_hooks, duration,
+                                       output_format)
+            except Exception as e:
+                result = {'success': False, 'input': input_file, 'output': None,
+                          'returncode': None, 'elapsed': 0, 'error': str(e)}
+            # 只调用一个回调；回调出错只打印，不能让工作线程退出
+            callback = on_success if result['success'] else on_failure
+            if callback:
+                try:
+                    callback(result)
+                except Exception as e:
+                    print(f"\n转码结果处理出错: {input_file} {e}")
+            with self._lock:
+                self.results.append(result)
+
+    def close(self):
+        """等待队列中的文件全部转码完成，返回结果列表"""
+        if self._closed:
+            return self.results
+        self._closed = True
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        return self.results
+
+
+def audio_ydl_opts(fmt, cookies_path=None, progress_hooks=()):
+    """
+    下载音频使用的 yt-dlp 配置
+    """
 
     ydl_opts = {
         'format': fmt,
         'outtmpl': 'audios/%(title)s.%(ext)s',
 
-        'progress_hooks': [progress_hook, hook],
+        'progress_hooks': list(progress_hooks),
 
         'user_agent': (
             'Mozilla/5.0 (Windows NT 10.0; Win64; x64) '
@@ -86,23 +407,397 @@ def download_audio(url, cookies_path=None, fmt='bestaudio'):
     if cookies_path and os.path.exists(cookies_path):
         ydl_opts['cookiefile'] = cookies_path
 
+    return ydl_opts
+
+
+def archive_kind(output_file):
+    """
+    按实际输出容器区分的归档类型，如 audio-mp3、audio-m4a，output_file 也可以只是扩展名
+    """
+
+    ext = os.path.splitext(output_file)[1] or output_file
+    return f"audio-{ext.lstrip('.').lower()}"
+
+
+def _fetch_audio(url, cookies_path=None, fmt='bestaudio'):
+    """
+    只下载音频，返回 {'path', 'acodec', 'duration'}，没有下载到文件时 path 为 None
+    """
+
+    os.makedirs("audios", exist_ok=True)
+
+    downloaded_file = {"path": None, "acodec": None, "duration": None}
+
+    def hook(d):
+        if d['status'] == 'finished':
+            downloaded_file['path'] = d['filename']
+            downloaded_file['acodec'] = (d.get('info_dict') or {}).get('acodec')
+            downloaded_file['duration'] = (d.get('info_dict') or {}).get('duration')
+            print(f"\n下载完成: {d['filename']}")
+
+    ydl_opts = audio_ydl_opts(fmt, cookies_path, [progress_hook, hook])
+
     with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-        ydl.download([url])
+        # 视频信息优先从缓存读取，格式地址过期时才重新解析
+        info = info_cache.extract_info(ydl, url, require=('formats',))
+        ydl.process_ie_result(info, download=True)
+
+    return downloaded_file
+
+
+def _record_audio(archive, url, fmt, output_file, output_format=None):
+    """
+    转码成功后写入归档：不指定输出格式时同时记录 'audio'（任意容器）
+    """
+
+    if not output_format:
+        archive.record(url, 'audio', output_file, fmt)
+    archive.record(url, archive_kind(output_file), output_file, fmt)
+
+
+def download_audio(url, cookies_path=None, fmt='bestaudio', pool=None, archive=download_archive, on_done=None,
+                   output_format=None):
+    """
+    下载音频 + 判断是否转码
+
+    传入 pool（TranscodePool）时转码放入工作池，不等待转码完成即返回。
+    on_done 在转码结束后（无论成功与否）以转码结果为参数调用，使用 pool 时在工作线程中调用。
+    archive 中已有同一视频同一格式的记录时跳过解析和下载，转码成功后写入记录；传入 None 不使用归档。
+    输出可能是 mp3、m4a 或 opus，记录写入 'audio'（任意容器）和按实际容器区分的 archive_kind 两类。
+    output_format 为 STREAM_OUTPUTS 中的格式时只输出该格式（见 convert_audio），
+    归档也只按该格式的 archive_kind 查找和记录。
+    """
+
+    kind = archive_kind(STREAM_OUTPUTS[output_format][0]) if output_format else 'audio'
+    if archive:
+        entry = archive.get(url, kind, fmt)
+        if entry:
+            print(f"\n已下载过，跳过: {entry['path']}")
+            return entry['path']
+
+    downloaded_file = _fetch_audio(url, cookies_path, fmt)
 
     # =========================
     # ⭐ 核心判断逻辑
     # =========================
     file_path = downloaded_file['path']
 
-    if file_path and need_convert_to_mp3(file_path):
-        convert_to_mp3(file_path)
+    if not file_path:
+        return None
+
+    def on_success(result):
+        try:
+            if archive:
+                _record_audio(archive, url, fmt, result['output'], output_format)
+        finally:
+            # 归档写入失败也要报告转码结果
+            if on_done:
+                on_done(result)
+
+    if pool:
+        pool.submit(file_path, downloaded_file['acodec'], downloaded_file['duration'], on_success, on_done,
+                    output_format)
     else:
-        print("无需转码，直接使用原音频")
+        result = convert_audio(file_path, downloaded_file['acodec'], progress_hooks=[progress_hook],
+                               duration=downloaded_file['duration'], output_format=output_format)
+        if result['success']:
+            on_success(result)
+        elif on_done:
+            on_done(result)
+
+    return file_path
+
+
+# 需要 seek 才能解析的容器（moov 可能在文件末尾），不能从管道读取
+_UNSTREAMABLE_EXTS = ('mp4', 'm4a', 'mov', '3gp')
+# 每次从网络读取的大小
+STREAM_READ_SIZE = 256 * 1024
+
+
+def can_stream(info):
+    """
+    判断选中的格式能否边下载边送入 ffmpeg：只支持单个 http(s) 直链
+    """
+
+    if info.get('requested_formats') or info.get('fragments'):
+        return False
+    if info.get('protocol') not in ('http', 'https') or not info.get('url'):
+        return False
+    return info.get('ext') not in _UNSTREAMABLE_EXTS
+
+
+def _iter_http_chunks(ydl, info, read_size=STREAM_READ_SIZE):
+    """
+    逐块读取格式直链的内容
+
+    格式指定了 http_chunk_size 时（如 YouTube）按 Range 分段请求，避免单个连接被限速。
+    """
+
+    url = info['url']
+    headers = dict(info.get('http_headers') or {})
+    chunk_size = (info.get('downloader_options') or {}).get('http_chunk_size')
+
+    if not chunk_size:
+        with ydl.urlopen(Request(url, headers=headers)) as response:
+            yield from iter(lambda: response.read(read_size), b'')
+        return
+
+    start = 0
+    while True:
+        range_headers = dict(headers, Range=f"bytes={start}-{start + chunk_size - 1}")
+        received = 0
+        with ydl.urlopen(Request(url, headers=range_headers)) as response:
+            content_range = response.headers.get('Content-Range') or ''
+            total = int(content_range.rpartition('/')[2]) if content_range.rpartition('/')[2].isdigit() else None
+            for data in iter(lambda: response.read(read_size), b''):
+                received += len(data)
+                yield data
+            partial = response.status == 206
+        start += received
+        # 服务器忽略 Range 时已经收到完整内容
+        if not partial or not received or (total is not None and start >= total):
+            return
+
+
+def stream_audio(url, cookies_path=None, fmt='bestaudio', output_format='mp3', archive=download_archive):
+    """
+    边下载边转码：音频数据直接通过管道送入 ffmpeg，不保存中间文件
+
+    output_format 为 'mp3' 或 'wav'（16kHz 单声道 PCM）。
+    选中的格式不能流式处理或流式处理失败时，退回到先下载再转码，输出格式不变。
+    返回 {'success', 'input', 'output', 'returncode', 'elapsed', 'error', 'mode'}，
+    流式处理时 mode 为 'stream'，退回两步流程时为 convert_audio 的处理方式，归档中已有记录时为 'archived'。
+    """
+
+    ext, codec_args = STREAM_OUTPUTS[output_format]
+    # 按输出容器查找和记录，两步流程复制出的 .m4a/.opus 不会被当作 mp3 跳过
+    kind = archive_kind(ext)
+    if archive:
+        entry = archive.get(url, kind, fmt)
+        if entry:
+            print(f"\n已下载过，跳过: {entry['path']}")
+            return {'success': True, 'input': url, 'output': entry['path'], 'returncode': 0, 'elapsed': 0,
+                    'error': None, 'encoded_seconds': None, 'speed': None, 'mode': 'archived'}
+
+    os.makedirs("audios", exist_ok=True)
+
+    with yt_dlp.YoutubeDL(audio_ydl_opts(fmt, cookies_path)) as ydl:
+        info = info_cache.extract_info(ydl, url, require=('formats',))
+        # 只选择格式，不下载
+        info = ydl.process_ie_result(info, download=False)
+
+        if not can_stream(info):
+            print(f"\n格式 {info.get('format_id')} ({info.get('protocol')}, {info.get('ext')}) 不支持流式处理，改为先下载再转码")
+            return _download_then_convert(url, cookies_path, fmt, output_format, archive=archive)
+
+        output_file = os.path.splitext(ydl.prepare_filename(info))[0] + ext
+        cmd = [
+            "ffmpeg",
+            "-y",
+            "-hide_banner",
+            "-loglevel", "error",
+            "-nostats",
+            "-progress", "pipe:1",
+            "-i", "pipe:0",
+            "-vn",
+            *codec_args,
+            output_file
+        ]
+        print(f"\n边下载边转码: {info.get('title')} → {output_file}")
+
+        start = time.perf_counter()
+        downloaded = 0
+        total = info.get('filesize') or info.get('filesize_approx')
+        error = None
+        try:
+            process = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        except OSError as e:
+            return _download_then_convert(url, cookies_path, fmt, output_format, reason=str(e), archive=archive)
+
+        # stderr 在后台读取，避免 ffmpeg 输出过多时阻塞
+        stderr_chunks = []
+        stderr_thread = threading.Thread(target=lambda: stderr_chunks.append(process.stderr.read()), daemon=True)
+        stderr_thread.start()
+        # 下载进度已经通过 progress_hook 显示，这里只记录转码速度
+        last_event = {}
+        progress_thread = threading.Thread(
+            target=_read_progress,
+            args=(process.stdout, output_file, info.get('duration'), start, (), last_event),
+            daemon=True
+        )
+        progress_thread.start()
+        try:
+            for data in _iter_http_chunks(ydl, info):
+                process.stdin.write(data)
+                downloaded += len(data)
+                progress_hook(_stream_progress(downloaded, total, time.perf_counter() - start, output_file))
+        except BrokenPipeError:
+            # ffmpeg 提前退出，错误信息见 stderr
+            pass
+        except Exception as e:
+            error = str(e)
+        finally:
+            try:
+                process.stdin.close()
+            except BrokenPipeError:
+                pass
+        returncode = process.wait()
+        stderr_thread.join()
+        progress_thread.join()
+        elapsed = time.perf_counter() - start
+        progress_hook({'status': 'error' if error or returncode else 'finished', 'filename': output_file,
+                       'downloaded_bytes': downloaded, 'total_bytes': total})
+
+    if not error and returncode:
+        error = b''.join(stderr_chunks).decode('utf-8', 'replace').strip()[-2000:]
+    if error:
+        print(f"\n流式转码失败 (返回码 {returncode}): {error}")
+        if os.path.exists(output_file):
+            os.remove(output_file)
+        return _download_then_convert(url, cookies_path, fmt, output_format, reason=error, archive=archive)
+
+    print(f"\n转码完成: {output_file} ({downloaded / 1024 / 1024:.1f}MB，{elapsed:.1f}秒)")
+    if archive:
+        archive.record(url, kind, output_file, fmt)
+    return {
+        'success': True,
+        'input': info.get('url'),
+        'output': output_file,
+        'returncode': returncode,
+        'elapsed': elapsed,
+        'error': None,
+        'encoded_seconds': last_event.get('encoded_seconds'),
+        'speed': last_event.get('speed'),
+        'mode': 'stream'
+    }
+
+
+def _stream_progress(downloaded, total, elapsed, filename):
+    """
+    生成与 yt-dlp 下载进度相同格式的进度信息
+    """
+
+    speed = downloaded / elapsed if elapsed else None
+    percent = f"{downloaded / total * 100:5.1f}%" if total else ''
+    eta = ''
+    if total and speed:
+        eta_seconds = int(max(total - downloaded, 0) / speed)
+        eta = f"{eta_seconds // 60:02d}:{eta_seconds % 60:02d}"
+    return {
+        'status': 'downloading',
+        'filename': filename,
+        'downloaded_bytes': downloaded,
+        'total_bytes': total,
+        'elapsed': elapsed,
+        'speed': speed,
+        '_percent_str': percent,
+        '_speed_str': f"{speed / 1024 / 1024:.2f}MiB/s" if speed else '',
+        '_eta_str': eta
+    }
+
+
+def _download_then_convert(url, cookies_path, fmt, output_format, reason=None, archive=download_archive):
+    """
+    流式处理不可用时的两步流程：下载完成后再转码为 output_format
+    """
+
+    if reason:
+        print(f"改为先下载再转码: {reason}")
+    with TranscodePool(1) as pool:
+        file_path = download_audio(url, cookies_path, fmt, pool, archive, output_format=output_format)
+    if not file_path:
+        return {'success': False, 'input': url, 'output': None, 'returncode': None, 'elapsed': 0,
+                'error': '下载失败', 'encoded_seconds': None, 'speed': None, 'mode': None}
+    if not pool.results:
+        # 归档中已有记录，没有下载
+        return {'success': True, 'input': url, 'output': file_path, 'returncode': 0, 'elapsed': 0,
+                'error': None, 'encoded_seconds': None, 'speed': None, 'mode': 'archived'}
+    return pool.results[0]
+
+
+def queue_handler(job):
+    """
+    任务队列中的单个任务（在工作进程中）：只下载，下载完成后交给主进程的转码池
+
+    归档中已有记录时直接完成。
+    """
+
+    fmt = job['format'] or 'bestaudio'
+    entry = download_archive.get(job['url'], 'audio', fmt)
+    if entry:
+        return {'path': entry['path'], 'mode': 'archived'}
+
+    downloaded_file = _fetch_audio(job['url'], COOKIES_PATH, fmt)
+    if not downloaded_file['path']:
+        raise RuntimeError(f"下载失败: {job['url']}")
+    return job['handoff'](downloaded_file)
+
+
+def _job_result(result):
+    """
+    保存在任务队列中的转码结果，用于结束时的统计
+    """
+
+    job_result = {key: result.get(key) for key in ('mode', 'elapsed', 'encoded_seconds', 'speed')}
+    job_result['path'] = result['output']
+    return job_result
+
+
+def print_transcode_summary(results):
+    """
+    打印转码统计：各处理方式的数量、ffmpeg 总耗时、平均编码速度和最慢的任务
+    """
+
+    results = [result for result in results if result.get('mode') != 'archived']
+    if not results:
+        return
+    total = sum(result['elapsed'] or 0 for result in results)
+    modes = {mode: sum(1 for result in results if result.get('mode') == mode) for mode in ('encode', 'copy', 'keep')}
+    print(f"\n转码 {len(results)} 个文件（重新编码 {modes['encode']}，复制音频流 {modes['copy']}，"
+          f"直接使用 {modes['keep']}），ffmpeg 总耗时 {total:.1f}秒")
+    # 编码速度（相对实时的倍数），用于估算工作池大小和发现慢任务
+    timed = [result for result in results if result.get('encoded_seconds') and result['elapsed']]
+    if timed:
+        encoded = sum(result['encoded_seconds'] for result in timed)
+        busy = sum(result['elapsed'] for result in timed)
+        slowest = min(timed, key=lambda result: result['encoded_seconds'] / result['elapsed'])
+        print(f"平均每个任务 {encoded / busy:.1f}x 实时，"
+              f"最慢: {slowest['path']} ({slowest['encoded_seconds'] / slowest['elapsed']:.1f}x)")
+
+
+def run_queue(workers=2, transcode_workers=None, threads_per_job=1):
+    """
+    处理队列中的音频任务：workers 个工作进程只负责下载，下载完成的文件交给本进程中
+    transcode_workers 个线程的转码池（默认与 CPU 核数相同），threads_per_job 为每个 ffmpeg 的线程数。
+    转码池已有 2 倍于线程数的任务时，工作进程等待，不会无限制地提前下载。
+    工作进程的下载进度发送到本进程，与转码进度一起汇总输出。
+    """
+
+    with download_progress, TranscodePool(transcode_workers, threads_per_job, [progress_hook]) as pool:
+        def transcode(job, downloaded_file):
+            fmt = job['format'] or 'bestaudio'
+
+            def on_done(result):
+                if not result['success']:
+                    job['finish'](error=RuntimeError(f"转码失败: {result['input']} {result['error']}"))
+                    return
+                try:
+                    _record_audio(download_archive, job['url'], fmt, result['output'])
+                finally:
+                    job['finish'](_job_result(result))
+
+            pool.submit(downloaded_file['path'], downloaded_file['acodec'], downloaded_file['duration'],
+                        on_done, on_done)
+
+        print(f"{workers} 个下载进程，{pool.workers} 个转码线程（每个 ffmpeg {threads_per_job} 个线程）")
+        return run_workers(QUEUE_NAME, queue_handler, workers, on_handoff=transcode,
+                           max_handoff=pool.workers * 2, on_event=progress_hook, initializer=forward_events,
+                           summary=print_transcode_summary)
 
 
 def list_formats(url, cookies_path=None):
+    # 不使用 listformats 选项，缓存命中时由 ydl.list_formats 直接列出
     ydl_opts = {
-        'listformats': True,
         'quiet': False,
     }
 
@@ -110,38 +805,64 @@ def list_formats(url, cookies_path=None):
         ydl_opts['cookiefile'] = cookies_path
 
     with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-        ydl.download([url])
+        info = info_cache.extract_info(ydl, url, require=('formats',))
+        ydl.list_formats(info)
 
 
-def progress_hook(d):
-    if d.get('status') == 'downloading':
-        print(
-            f"\r下载中: {d.get('_percent_str','').strip()} "
-            f"{d.get('_speed_str','')} "
-            f"{d.get('_eta_str','')}",
-            end=''
-        )
+# 下载和转码进度由 download_progress 汇总，按固定频率输出
+progress_hook = download_progress.hook
 
 
 def main():
+    if len(sys.argv) >= 2 and sys.argv[1] == 'resume':
+        # 继续处理队列中未完成的任务（包括中断时正在运行的任务）
+        workers = int(sys.argv[2]) if len(sys.argv) > 2 else 2
+        transcode_workers = int(sys.argv[3]) if len(sys.argv) > 3 else None
+        threads_per_job = int(sys.argv[4]) if len(sys.argv) > 4 else 1
+        run_queue(workers, transcode_workers, threads_per_job)
+        return
+
     if len(sys.argv) < 3:
-        print("用法: python xxx.py <url> list|audio")
+        print("用法: python xxx.py <url> list|audio [format]")
+        print("      python xxx.py <url> stream [format] [mp3|wav]")
+        print("      python xxx.py <url列表文件> batch [format] [下载进程数] [转码线程数] [每个转码的线程数]")
+        print("      python xxx.py resume [下载进程数] [转码线程数] [每个转码的线程数]")
         return
 
     url = sys.argv[1]
     action = sys.argv[2]
 
-    cookies_path = 'www.youtube.com_cookies.txt'
+    cookies_path = COOKIES_PATH
 
     if action == 'list':
         list_formats(url, cookies_path)
 
     elif action == 'audio':
         fmt = sys.argv[3] if len(sys.argv) > 3 else 'bestaudio'
-        download_audio(url, cookies_path, fmt)
+        with download_progress:
+            download_audio(url, cookies_path, fmt)
+
+    elif action == 'stream':
+        fmt = sys.argv[3] if len(sys.argv) > 3 else 'bestaudio'
+        output_format = sys.argv[4] if len(sys.argv) > 4 else 'mp3'
+        with download_progress:
+            stream_audio(url, cookies_path, fmt, output_format)
+
+    elif action == 'batch':
+        fmt = sys.argv[3] if len(sys.argv) > 3 else 'bestaudio'
+        workers = int(sys.argv[4]) if len(sys.argv) > 4 else 2
+        transcode_workers = int(sys.argv[5]) if len(sys.argv) > 5 else None
+        threads_per_job = int(sys.argv[6]) if len(sys.argv) > 6 else 1
+        with open(url, 'r', encoding='utf-8') as f:
+            urls = [line.strip() for line in f if line.strip() and not line.startswith('#')]
+        # 任务先写入队列，中断后可以用 resume 继续
+        with JobQueue() as job_queue:
+            added = job_queue.add(QUEUE_NAME, urls, fmt)
+        print(f"加入 {added} 个新任务（共 {len(urls)} 个URL）")
+        run_queue(workers, transcode_workers, threads_per_job)
 
     else:
-        print("仅支持 list / audio")
+        print("仅支持 list / audio / stream / batch / resume")
 
 
 if __name__ == '__main__':
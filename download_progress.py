@@ -0,0 +1,206 @@
+import sys
+import threading
+import time
+
+
+# 转发到主进程的进度字段，其他字段（如 info_dict）可能很大或无法序列化
+FORWARDED_FIELDS = ('status', 'filename', 'downloaded_bytes', 'total_bytes', 'total_bytes_estimate')
+
+
+def _format_bytes(size):
+    return f"{size / 1024 / 1024:.1f}MiB"
+
+
+def _format_eta(seconds):
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+    return f"{seconds // 60:02d}:{seconds % 60:02d}"
+
+
+class DownloadProgress:
+    """汇总多个下载的进度，按固定频率输出一行
+
+    hook 作为 yt-dlp 的 progress_hooks 使用（也接收转码的 transcoding / transcoded 事件），
+    每次回调只把最新的进度字典按文件名存入字典，不做格式化和输出。
+    后台线程每隔 interval 秒汇总一次：进行中的下载数、已下载/总大小、总速度（按两次输出之间
+    新增的字节数计算并平滑）、整批的剩余时间，以及进行中的转码数和已完成/失败的数量。
+    queued 事件（{'status': 'queued', 'count': 数量}）报告队列中等待的任务数，
+    剩余时间按已完成下载的平均大小计入这些任务。
+    后台线程在收到第一个事件时启动，close 停止并输出最后一行。
+
+    工作进程中调用 forward(send) 后不再自己输出，hook 只保留 FORWARDED_FIELDS 中的字段，
+    下载中的事件每个文件每 interval 秒最多转发一次，由主进程中的实例统一汇总输出。
+    """
+
+    def __init__(self, interval=0.5, stream=None):
+        self.interval = interval
+        self.stream = stream
+        self._downloading = {}
+        self._transcoding = {}
+        self._done_bytes = 0
+        self._finished = 0
+        self._failed = 0
+        self._done_count = 0
+        self._queued = 0
+        self._send = None
+        self._sent = {}
+        self._speed = None
+        self._last_bytes = 0
+        self._last_time = None
+        self._line_length = 0
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def forward(self, send):
+        """之后的事件交给 send（如发往主进程的消息队列），不在本进程中输出"""
+        self._send = send
+
+    def _forward(self, d):
+        status = d.get('status')
+        if status == 'downloading':
+            now = time.perf_counter()
+            if now - self._sent.get(d.get('filename'), 0) < self.interval:
+                return
+            self._sent[d.get('filename')] = now
+        else:
+            self._sent.pop(d.get('filename'), None)
+        self._send({key: d.get(key) for key in FORWARDED_FIELDS})
+
+    def hook(self, d):
+        """进度回调"""
+        if self._send is not None:
+            self._forward(d)
+            return
+        status = d.get('status')
+        if status == 'queued':
+            self._queued = d.get('count') or 0
+        elif status == 'downloading':
+            self._downloading[d.get('filename')] = d
+        elif status == 'transcoding':
+            self._transcoding[d.get('filename')] = d
+        elif status == 'transcoded':
+            self._transcoding.pop(d.get('filename'), None)
+        elif status in ('finished', 'error'):
+            # 没有下载过程的事件（如文件已存在）不计入下载字节数
+            if self._downloading.pop(d.get('filename'), None) is not None:
+                self._done_bytes += d.get('downloaded_bytes') or d.get('total_bytes') or 0
+                self._done_count += 1
+            if status == 'finished':
+                self._finished += 1
+            else:
+                self._failed += 1
+        if self._thread is None:
+            self._start()
+
+    def _start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._stop.clear()
+            self._last_time = time.perf_counter()
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.render()
+
+    def summary(self):
+        """当前的汇总进度"""
+        downloading = list(self._downloading.values())
+        downloaded = self._done_bytes
+        remaining = 0
+        total_known = bool(downloading)
+        totals = []
+        for d in downloading:
+            current = d.get('downloaded_bytes') or 0
+            total = d.get('total_bytes') or d.get('total_bytes_estimate')
+            downloaded += current
+            if total:
+                remaining += max(total - current, 0)
+                totals.append(total)
+            else:
+                total_known = False
+        if self._queued:
+            # 等待中的任务按已完成下载的平均大小估算，还没有完成的下载时按进行中的下载估算
+            if self._done_count:
+                remaining += self._queued * self._done_bytes / self._done_count
+            elif totals:
+                remaining += self._queued * sum(totals) / len(totals)
+            else:
+                total_known = False
+
+        now = time.perf_counter()
+        elapsed = now - self._last_time if self._last_time else 0
+        if elapsed > 0:
+            speed = max(downloaded - self._last_bytes, 0) / elapsed
+            # 平滑，避免每次输出的速度和剩余时间跳动
+            self._speed = speed if self._speed is None else 0.3 * speed + 0.7 * self._speed
+            self._last_bytes = downloaded
+            self._last_time = now
+
+        return {
+            'active': len(downloading),
+            'queued': self._queued,
+            'transcoding': len(self._transcoding),
+            'finished': self._finished,
+            'failed': self._failed,
+            'downloaded_bytes': downloaded,
+            'remaining_bytes': remaining if total_known else None,
+            'speed': self._speed,
+            'eta': remaining / self._speed if total_known and self._speed else None
+        }
+
+    def render(self):
+        """输出一行汇总进度"""
+        info = self.summary()
+        size = _format_bytes(info['downloaded_bytes'])
+        if info['remaining_bytes'] is not None:
+            size += f"/{_format_bytes(info['downloaded_bytes'] + info['remaining_bytes'])}"
+        parts = [f"下载 {info['active']} 个 {size}"]
+        if info['active']:
+            if info['speed']:
+                parts.append(f"{_format_bytes(info['speed'])}/s")
+            if info['eta'] is not None:
+                parts.append(f"剩余 {_format_eta(info['eta'])}")
+        if info['queued']:
+            parts.append(f"| 队列 {info['queued']} 个")
+        if info['transcoding']:
+            parts.append(f"| 转码 {info['transcoding']} 个")
+        parts.append(f"| 完成 {info['finished']} 失败 {info['failed']}")
+
+        line = ' '.join(parts)
+        padding = ' ' * max(self._line_length - len(line), 0)
+        self._line_length = len(line)
+        stream = self.stream or sys.stdout
+        stream.write(f"\r{line}{padding}")
+        stream.flush()
+
+    def close(self):
+        """停止后台输出，输出最后一行并换行"""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        self._stop.set()
+        thread.join()
+        self.render()
+        (self.stream or sys.stdout).write('\n')
+        self._line_length = 0
+
+
+# 所有入口共享的进度汇总
+download_progress = DownloadProgress()
+
+
+def forward_events(send):
+    """在工作进程中调用（如 run_workers 的 initializer）：download_progress 的事件交给 send"""
+    download_progress.forward(send)
@@ -1,7 +1,21 @@
 import sys
 import yt_dlp
+from download_archive import download_archive
+from download_progress import download_progress, forward_events
+from job_queue import JobQueue, run_workers
+
+COOKIES_PATH = r'E:\research\demo\moviepy_speech_recognition\www.youtube.com_cookies.txt'
+# 任务队列中视频下载任务的队列名
+QUEUE_NAME = 'video'
+
+def download_youtube_video(url, cookies_path, fmt='137+140', archive=download_archive):
+    # 归档中已有同一格式的下载时跳过解析和下载
+    if archive:
+        entry = archive.get(url, 'video', fmt)
+        if entry:
+            print(f"已下载过，跳过: {entry['path']}")
+            return entry['path']
 
-def download_youtube_video(url, cookies_path, fmt='137+140'):
     # 下载配置
     ydl_opts = {
         #'cookiefile': cookies_path,                # 指定 cookies 文件
@@ -13,10 +27,8 @@ def download_youtube_video(url, cookies_path, fmt='137+140'):
         'merge_output_format': 'mp4',
         # 输出路径和文件名
         'outtmpl': 'videos/%(title)s.%(ext)s',
-        # 显示进度
-        'progress_hooks': [
-            lambda d: print(f"[{d.get('status')}] {d.get('filename')}") if d.get('status') else None
-        ],
+        # 显示进度（按固定频率汇总输出）
+        'progress_hooks': [download_progress.hook],
         "user_agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
         "http_headers": {
             "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
@@ -25,8 +37,28 @@ def download_youtube_video(url, cookies_path, fmt='137+140'):
     }
 
     # 执行下载
-    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-        ydl.download([url])
+    with download_progress, yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        info = ydl.extract_info(url, download=True)
+
+    # 记录合并后的最终文件
+    downloads = (info or {}).get('requested_downloads') or []
+    file_path = downloads[-1].get('filepath') if downloads else None
+    if file_path and archive:
+        archive.record(url, 'video', file_path, fmt)
+    return file_path
+
+def queue_handler(job):
+    """任务队列中的单个任务：下载视频，成功时返回输出文件"""
+    file_path = download_youtube_video(job['url'], COOKIES_PATH, job['format'] or '137+140')
+    if not file_path:
+        raise RuntimeError(f"下载失败: {job['url']}")
+    return {'path': file_path}
+
+def run_queue(workers=2):
+    """处理队列中的视频任务，各工作进程的下载进度汇总到本进程统一输出"""
+    with download_progress:
+        return run_workers(QUEUE_NAME, queue_handler, workers, on_event=download_progress.hook,
+                           initializer=forward_events)
 
 def list_formats(url, cookies_path):
     """
@@ -48,11 +80,19 @@ def main():
     用法：
       python download_ytdlp.py <url> list
       python download_ytdlp.py <url> download [format]
+      python download_ytdlp.py <url列表文件> batch [format] [工作进程数]
+      python download_ytdlp.py resume [工作进程数]
 
     例：
       python download_ytdlp.py https://www.youtube.com/watch?v=xxxx list
       python download_ytdlp.py https://www.youtube.com/watch?v=xxxx download "137+140"
     """
+    if len(sys.argv) >= 2 and sys.argv[1] == 'resume':
+        # 继续处理队列中未完成的任务（包括中断时正在运行的任务）
+        workers = int(sys.argv[2]) if len(sys.argv) > 2 else 2
+        run_queue(workers)
+        return
+
     if len(sys.argv) < 3:
         print(main.__doc__)
         sys.exit(1)
@@ -61,13 +101,22 @@ def main():
     action = sys.argv[2].lower()
     fmt = sys.argv[3] if len(sys.argv) > 3 else '137+140'
 
-    cookies_path = r'E:\research\demo\moviepy_speech_recognition\www.youtube.com_cookies.txt'
+    cookies_path = COOKIES_PATH
     if action == 'list':
         list_formats(url, cookies_path)
     elif action == 'download':
         download_youtube_video(url, cookies_path, fmt)
+    elif action == 'batch':
+        workers = int(sys.argv[4]) if len(sys.argv) > 4 else 2
+        with open(url, 'r', encoding='utf-8') as f:
+            urls = [line.strip() for line in f if line.strip() and not line.startswith('#')]
+        # 任务先写入队列，中断后可以用 resume 继续
+        with JobQueue() as job_queue:
+            added = job_queue.add(QUEUE_NAME, urls, fmt)
+        print(f"加入 {added} 个新任务（共 {len(urls)} 个URL），{workers} 个工作进程")
+        run_queue(workers)
     else:
-        print("❌ 无效的操作，请使用 list 或 download")
+        print("❌ 无效的操作，请使用 list / download / batch / resume")
 
 if __name__ == '__main__':
      main()
\ No newline at end of file
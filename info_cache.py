@@ -0,0 +1,172 @@
+import copy
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+import yt_dlp
+
+# 默认缓存目录，位于仓库根目录，各入口脚本共享
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.info_cache')
+
+# 各字段的有效期（秒）。格式和字幕地址带有签名，几个小时后就会失效；
+# 评论和播放数据变化较快；标题、时长等其他字段使用 DEFAULT_TTL
+FIELD_TTLS = {
+    'formats': 3 * 3600,
+    'url': 3 * 3600,
+    'manifest_url': 3 * 3600,
+    'fragments': 3 * 3600,
+    'http_headers': 3 * 3600,
+    'subtitles': 3 * 3600,
+    'automatic_captions': 3 * 3600,
+    'comment_count': 6 * 3600,
+    'view_count': 24 * 3600,
+    'like_count': 24 * 3600,
+}
+DEFAULT_TTL = 7 * 24 * 3600
+
+# 不缓存的字段。评论列表可能非常大，放入缓存会常驻内存 LRU、每次写入都重写整个文件，
+# 需要评论时总是重新获取
+UNCACHED_FIELDS = ('comments',)
+
+_UNSAFE_CHARS_RE = re.compile(r'[^\w.-]')
+
+
+@lru_cache(maxsize=4096)
+def canonical_key(url):
+    """不联网解析出 URL 对应的视频，返回 '提取器:视频ID'，无法识别时返回 URL 本身"""
+    for ie in yt_dlp.extractor.gen_extractor_classes():
+        if ie.ie_key() == 'Generic' or not ie.suitable(url):
+            continue
+        video_id = ie.get_temp_id(url)
+        if video_id:
+            return f"{ie.ie_key().lower()}:{video_id}"
+        break
+    return url
+
+
+class InfoCache:
+    """extract_info 结果缓存
+
+    进程内保存最近使用的条目（LRU），同时在磁盘上每个视频保存一个 JSON 文件，
+    多个进程可以共享。每个字段单独记录获取时间并按 FIELD_TTLS 过期，
+    磁盘文件通过临时文件 + os.replace 原子写入。UNCACHED_FIELDS 中的字段不保存，
+    require 中包含这些字段时总是重新获取。内存中的条目只在磁盘文件没有变化时使用，
+    其他进程更新或删除（invalidate）的条目不会继续使用旧的内存副本。
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR, max_memory_entries=256, field_ttls=None, default_ttl=DEFAULT_TTL):
+        self.cache_dir = cache_dir
+        self.max_memory_entries = max_memory_entries
+        self.field_ttls = dict(FIELD_TTLS, **(field_ttls or {}))
+        self.default_ttl = default_ttl
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _path(self, key):
+        """缓存文件路径，按哈希前两位分目录"""
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        name = _UNSAFE_CHARS_RE.sub('_', key)[:80]
+        return os.path.join(self.cache_dir, digest[:2], f"{name}_{digest[:12]}.json")
+
+    def _load(self, key):
+        """读取条目：磁盘文件的修改时间与内存中的副本相同时直接使用内存，否则读取磁盘"""
+        path = self._path(key)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            with self._lock:
+                self._memory.pop(key, None)
+            return None
+        with self._lock:
+            cached = self._memory.get(key)
+            if cached is not None and cached[0] == mtime:
+                self._memory.move_to_end(key)
+                return cached[1]
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        # 旧版本写入的文件中可能包含不缓存的字段
+        for field in UNCACHED_FIELDS:
+            entry['info'].pop(field, None)
+        self._remember(key, entry, mtime)
+        return entry
+
+    def _remember(self, key, entry, mtime):
+        """放入内存 LRU，mtime 为对应磁盘文件的修改时间"""
+        with self._lock:
+            self._memory[key] = (mtime, entry)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_memory_entries:
+                self._memory.popitem(last=False)
+
+    def get(self, url, require=()):
+        """返回未过期字段组成的信息字典；require 中的字段缺失或过期时返回 None"""
+        if any(field in UNCACHED_FIELDS for field in require):
+            return None
+        entry = self._load(canonical_key(url))
+        if entry is None:
+            return None
+        now = time.time()
+        info = {}
+        for field, value in entry['info'].items():
+            fetched = entry['fetched'].get(field, 0)
+            if now - fetched < self.field_ttls.get(field, self.default_ttl):
+                info[field] = value
+        if not info or any(field not in info for field in require):
+            return None
+        # yt-dlp 处理信息字典时会修改其中的内容（如 formats）：require 中的字段返回深拷贝，
+        # 其他字段只复制一层
+        for field, value in info.items():
+            info[field] = copy.deepcopy(value) if field in require else copy.copy(value)
+        return info
+
+    def put(self, url, info):
+        """保存 extract_info 的结果，与已有条目合并"""
+        key = canonical_key(url)
+        info = {field: value for field, value in info.items() if field not in UNCACHED_FIELDS}
+        info = yt_dlp.YoutubeDL.sanitize_info(info, remove_private_keys=True)
+        now = time.time()
+        entry = self._load(key) or {'info': {}, 'fetched': {}}
+        entry = {'info': dict(entry['info']), 'fetched': dict(entry['fetched'])}
+        for field, value in info.items():
+            entry['info'][field] = value
+            entry['fetched'][field] = now
+
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, temp_file = tempfile.mkstemp(suffix='.tmp', dir=os.path.dirname(path))
+        with open(fd, 'w', encoding='utf-8') as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(temp_file, path)
+        self._remember(key, entry, os.stat(path).st_mtime_ns)
+
+    def invalidate(self, url):
+        """删除视频的缓存条目（内存和磁盘），下次使用时重新解析"""
+        key = canonical_key(url)
+        with self._lock:
+            self._memory.pop(key, None)
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def extract_info(self, ydl, url, require=()):
+        """带缓存的 ydl.extract_info(url, download=False)"""
+        info = self.get(url, require)
+        if info is not None:
+            return info
+        info = ydl.extract_info(url, download=False)
+        if info:
+            self.put(url, info)
+        return info
+
+
+# 所有入口共享的默认缓存
+info_cache = InfoCache()
@@ -0,0 +1,510 @@
+import json
+import multiprocessing
+import os
+import random
+import socket
+import sqlite3
+import threading
+import time
+from yt_dlp.networking.exceptions import HTTPError, TransportError
+from yt_dlp.utils import DownloadError, ExtractorError, GeoRestrictedError, UnsupportedError
+from info_cache import info_cache
+
+# 默认队列文件，位于仓库根目录，音频和视频下载脚本共享（按队列名区分）
+QUEUE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.job_queue.sqlite')
+
+PENDING = 'pending'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+# job['handoff'](数据) 的返回值：任务已交给主进程（如转码池）继续处理，handler 直接返回它
+HANDED_OFF = object()
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    queue TEXT NOT NULL,
+    url TEXT NOT NULL,
+    format TEXT NOT NULL DEFAULT '',
+    state TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    next_run REAL NOT NULL DEFAULT 0,
+    lease_until REAL,
+    worker TEXT,
+    error TEXT,
+    result TEXT,
+    created REAL NOT NULL,
+    updated REAL NOT NULL,
+    UNIQUE (queue, url, format)
+);
+CREATE INDEX IF NOT EXISTS jobs_claim ON jobs (queue, state, next_run);
+'''
+
+
+def _pid_alive(pid):
+    """本机上的进程是否仍在运行"""
+    if os.name == 'nt':
+        import ctypes
+        kernel32 = ctypes.windll.kernel32
+        # PROCESS_QUERY_LIMITED_INFORMATION
+        handle = kernel32.OpenProcess(0x1000, False, pid)
+        if not handle:
+            # 拒绝访问说明进程存在（属于其他用户）
+            return kernel32.GetLastError() == 5
+        exit_code = ctypes.c_ulong()
+        kernel32.GetExitCodeProcess(handle, ctypes.byref(exit_code))
+        kernel32.CloseHandle(handle)
+        # STILL_ACTIVE
+        return exit_code.value == 259
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _cause(error):
+    """异常的原因：DownloadError 把原始异常保存在 exc_info 中，yt-dlp 的其他异常保存在 cause 中"""
+    exc_info = getattr(error, 'exc_info', None)
+    cause = exc_info[1] if exc_info else None
+    return cause or getattr(error, 'cause', None) or error.__cause__ or error.__context__
+
+
+def is_transient(error):
+    """网络错误、限流和服务器错误可以重试；视频不存在、不支持的网址等错误重试也不会成功"""
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        if isinstance(error, HTTPError):
+            return error.status in (403, 408, 429) or error.status >= 500
+        if isinstance(error, (TransportError, TimeoutError, ConnectionError)):
+            return True
+        if isinstance(error, (UnsupportedError, GeoRestrictedError)):
+            return False
+        cause = _cause(error)
+        if cause is None and isinstance(error, ExtractorError):
+            # 提取器明确报告的错误（如视频已删除）
+            return not error.expected
+        error = cause
+    return True
+
+
+def is_download_error(error):
+    """错误是否来自下载或 HTTP 请求（而不是转码等本地处理）"""
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        if isinstance(error, (DownloadError, HTTPError, TransportError)):
+            return True
+        error = _cause(error)
+    return False
+
+
+class JobQueue:
+    """保存在 SQLite 中的下载任务队列
+
+    任务状态为 pending / running / done / failed。工作进程领取任务时写入租约到期时间，
+    运行期间定时续约；进程意外退出后租约过期，任务会被其他工作进程重新领取。
+    可重试的错误按指数退避重新排队，超过 max_attempts 次后标记为 failed。
+    领取任务在 BEGIN IMMEDIATE 事务中进行，多个进程同时领取也不会拿到同一个任务。
+    """
+
+    def __init__(self, queue_file=QUEUE_FILE, lease_seconds=300, max_attempts=5,
+                 backoff_base=30, backoff_max=3600):
+        self.queue_file = queue_file
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.conn = sqlite3.connect(queue_file, timeout=30, isolation_level=None, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def add(self, queue, urls, fmt=''):
+        """加入任务，同一队列中相同的 URL 和格式只加入一次，返回新加入的数量"""
+        now = time.time()
+        with self._lock:
+            self.conn.execute('BEGIN IMMEDIATE')
+            try:
+                before = self.conn.total_changes
+                self.conn.executemany(
+                    'INSERT OR IGNORE INTO jobs (queue, url, format, max_attempts, created, updated) '
+                    'VALUES (?, ?, ?, ?, ?, ?)',
+                    [(queue, url, fmt or '', self.max_attempts, now, now) for url in urls]
+                )
+                added = self.conn.total_changes - before
+                self.conn.execute('COMMIT')
+            except BaseException:
+                self.conn.execute('ROLLBACK')
+                raise
+        return added
+
+    def claim(self, queue, worker):
+        """领取一个可以运行的任务（待运行且已到重试时间，或租约已过期），没有时返回 None"""
+        now = time.time()
+        with self._lock:
+            self.conn.execute('BEGIN IMMEDIATE')
+            try:
+                row = self.conn.execute(
+                    'SELECT id, url, format, attempts FROM jobs WHERE queue = ? AND '
+                    '((state = ? AND next_run <= ?) OR (state = ? AND lease_until < ?)) '
+                    'ORDER BY next_run, id LIMIT 1',
+                    (queue, PENDING, now, RUNNING, now)
+                ).fetchone()
+                if row is not None:
+                    self.conn.execute(
+                        'UPDATE jobs SET state = ?, attempts = attempts + 1, lease_until = ?, worker = ?, updated = ? '
+                        'WHERE id = ?',
+                        (RUNNING, now + self.lease_seconds, worker, now, row[0])
+                    )
+                self.conn.execute('COMMIT')
+            except BaseException:
+                self.conn.execute('ROLLBACK')
+                raise
+        if row is None:
+            return None
+        job_id, url, fmt, attempts = row
+        return {'id': job_id, 'queue': queue, 'url': url, 'format': fmt, 'attempt': attempts + 1}
+
+    def heartbeat(self, job, worker):
+        """续约，返回任务是否仍由该工作进程持有"""
+        now = time.time()
+        with self._lock:
+            cursor = self.conn.execute(
+                'UPDATE jobs SET lease_until = ?, updated = ? WHERE id = ? AND state = ? AND worker = ?',
+                (now + self.lease_seconds, now, job['id'], RUNNING, worker)
+            )
+        return cursor.rowcount == 1
+
+    def complete(self, job, worker, result=None):
+        """标记任务完成"""
+        with self._lock:
+            self.conn.execute(
+                'UPDATE jobs SET state = ?, lease_until = NULL, error = NULL, result = ?, updated = ? '
+                'WHERE id = ? AND worker = ?',
+                (DONE, json.dumps(result, ensure_ascii=False), time.time(), job['id'], worker)
+            )
+
+    def fail(self, job, worker, error, transient=True):
+        """记录失败：可重试且未超过次数时按指数退避重新排队，否则标记为 failed，返回新的状态"""
+        now = time.time()
+        with self._lock:
+            attempts, max_attempts = self.conn.execute(
+                'SELECT attempts, max_attempts FROM jobs WHERE id = ?', (job['id'],)
+            ).fetchone()
+            if transient and attempts < max_attempts:
+                delay = min(self.backoff_base * 2 ** (attempts - 1), self.backoff_max)
+                delay *= random.uniform(0.8, 1.2)
+                state, next_run = PENDING, now + delay
+            else:
+                state, next_run = FAILED, now
+            self.conn.execute(
+                'UPDATE jobs SET state = ?, next_run = ?, lease_until = NULL, error = ?, updated = ? '
+                'WHERE id = ? AND worker = ?',
+                (state, next_run, str(error)[-2000:], now, job['id'], worker)
+            )
+        return state
+
+    def transfer(self, job, worker, new_worker):
+        """把仍由 worker 持有的任务转给 new_worker 并续约，返回是否成功"""
+        now = time.time()
+        with self._lock:
+            cursor = self.conn.execute(
+                'UPDATE jobs SET worker = ?, lease_until = ?, updated = ? WHERE id = ? AND state = ? AND worker = ?',
+                (new_worker, now + self.lease_seconds, now, job['id'], RUNNING, worker)
+            )
+        return cursor.rowcount == 1
+
+    def release(self, job, worker):
+        """放回仍由该工作进程持有的任务（如被 Ctrl+C 中断），不计入尝试次数，可以立即重新领取"""
+        with self._lock:
+            self.conn.execute(
+                'UPDATE jobs SET state = ?, attempts = MAX(attempts - 1, 0), next_run = 0, lease_until = NULL, '
+                'updated = ? WHERE id = ? AND state = ? AND worker = ?',
+                (PENDING, time.time(), job['id'], RUNNING, worker)
+            )
+
+    def release_dead(self, queue, host=None):
+        """
+        放回本机上已经退出的工作进程持有的任务，不等待租约过期，返回数量
+
+        工作进程名为 "主机名:进程号"；进程异常退出时尝试次数保持不变（可能是任务本身导致的）。
+        """
+        host = host or socket.gethostname()
+        with self._lock:
+            rows = self.conn.execute(
+                'SELECT id, worker FROM jobs WHERE queue = ? AND state = ? AND worker LIKE ?',
+                (queue, RUNNING, host + ':%')
+            ).fetchall()
+            released = 0
+            for job_id, worker in rows:
+                pid = worker.rpartition(':')[2]
+                if not pid.isdigit() or int(pid) == os.getpid() or _pid_alive(int(pid)):
+                    continue
+                cursor = self.conn.execute(
+                    'UPDATE jobs SET state = ?, next_run = 0, lease_until = NULL, updated = ? '
+                    'WHERE id = ? AND state = ? AND worker = ?',
+                    (PENDING, time.time(), job_id, RUNNING, worker)
+                )
+                released += cursor.rowcount
+        return released
+
+    def retry_failed(self, queue):
+        """将失败的任务重新放回队列，返回数量"""
+        with self._lock:
+            cursor = self.conn.execute(
+                'UPDATE jobs SET state = ?, attempts = 0, next_run = 0, updated = ? WHERE queue = ? AND state = ?',
+                (PENDING, time.time(), queue, FAILED)
+            )
+        return cursor.rowcount
+
+    def counts(self, queue):
+        """各状态的任务数"""
+        counts = {PENDING: 0, RUNNING: 0, DONE: 0, FAILED: 0}
+        with self._lock:
+            rows = self.conn.execute(
+                'SELECT state, COUNT(*) FROM jobs WHERE queue = ? GROUP BY state', (queue,)
+            ).fetchall()
+        counts.update(rows)
+        return counts
+
+    def failures(self, queue):
+        """失败的任务 [(url, 错误信息), ...]"""
+        with self._lock:
+            return self.conn.execute(
+                'SELECT url, error FROM jobs WHERE queue = ? AND state = ? ORDER BY id', (queue, FAILED)
+            ).fetchall()
+
+    def results(self, queue, since=0):
+        """since 之后完成的任务的结果列表"""
+        with self._lock:
+            rows = self.conn.execute(
+                'SELECT result FROM jobs WHERE queue = ? AND state = ? AND updated >= ? ORDER BY id',
+                (queue, DONE, since)
+            ).fetchall()
+        return [json.loads(row[0]) for row in rows if row[0]]
+
+    def next_wakeup(self, queue):
+        """最早可以领取的时间（等待重试的任务或其他进程持有的任务），没有未完成的任务时返回 None"""
+        with self._lock:
+            row = self.conn.execute(
+                'SELECT MIN(CASE WHEN state = ? THEN next_run ELSE lease_until END) FROM jobs '
+                'WHERE queue = ? AND state IN (?, ?)',
+                (PENDING, queue, PENDING, RUNNING)
+            ).fetchone()
+        return row[0]
+
+
+def _finish(job_queue, worker, job, result=None, error=None):
+    """报告任务结果：失败时按 is_transient 判断重新排队还是标记为失败"""
+    if error is None:
+        job_queue.complete(job, worker, result)
+    else:
+        if is_download_error(error):
+            # 缓存的视频信息中签名过的格式地址可能已过期或被封锁（如 403），重试时重新解析
+            info_cache.invalidate(job['url'])
+        state = job_queue.fail(job, worker, error, is_transient(error))
+        print(f"\n[{worker}] 任务 {job['id']} 失败（{'稍后重试' if state == PENDING else '不再重试'}）: {error}")
+
+
+def _keep_alive(job_queue, worker, held, lock, stop):
+    """定时为持有的任务续约，防止长时间的下载或转码被当作失效任务"""
+    while not stop.wait(job_queue.lease_seconds / 3):
+        with lock:
+            jobs = list(held.values())
+        for job in jobs:
+            job_queue.heartbeat(job, worker)
+
+
+def run_worker(queue, handler, queue_file=QUEUE_FILE, poll_interval=5, channel=None, initializer=None,
+               **queue_options):
+    """
+    循环领取并执行任务，直到队列中没有未完成的任务
+
+    handler(job) 返回可以 JSON 序列化的结果表示成功，抛出异常表示失败（由 is_transient 判断是否重试）。
+    channel 为 run_workers 创建的 (消息队列, 名额)，领取任务时向主进程报告等待中的任务数；
+    有名额时 handler 可以返回 job['handoff'](数据)，
+    把任务交给主进程继续处理；主进程没有空闲名额时等待，等待期间任务仍由本进程续约。
+    initializer(send) 在开始时调用，send(事件) 把事件发给主进程的 on_event。
+    中断（如 Ctrl+C）时持有的任务放回队列；启动和空闲时放回本机已退出的工作进程持有的任务。
+    """
+
+    worker = f"{socket.gethostname()}:{os.getpid()}"
+    parent = multiprocessing.parent_process()
+    with JobQueue(queue_file, **queue_options) as job_queue:
+        held = {}
+        lock = threading.Lock()
+
+        def handoff(job, payload):
+            messages, slots = channel
+            while not slots.acquire(timeout=poll_interval):
+                if parent is not None and not parent.is_alive():
+                    raise RuntimeError("主进程已退出")
+            job = {key: value for key, value in job.items() if key != 'handoff'}
+            messages.put(('handoff', worker, job, payload))
+            return HANDED_OFF
+
+        def send(event):
+            channel[0].put(('event', worker, None, event))
+
+        if channel and initializer:
+            initializer(send)
+
+        stop = threading.Event()
+        heartbeat_thread = threading.Thread(target=_keep_alive, args=(job_queue, worker, held, lock, stop),
+                                            daemon=True)
+        heartbeat_thread.start()
+        try:
+            released = job_queue.release_dead(queue)
+            if released:
+                print(f"[{worker}] 放回已退出的工作进程持有的 {released} 个任务")
+            while True:
+                job = job_queue.claim(queue, worker)
+                if job is None:
+                    if job_queue.release_dead(queue):
+                        continue
+                    wakeup = job_queue.next_wakeup(queue)
+                    if wakeup is None:
+                        return
+                    time.sleep(min(max(wakeup - time.time(), 0.1), poll_interval))
+                    continue
+
+                if channel:
+                    send({'status': 'queued', 'count': job_queue.counts(queue)[PENDING]})
+                    if channel[1] is not None:
+                        job['handoff'] = lambda payload, job=job: handoff(job, payload)
+                with lock:
+                    held[job['id']] = job
+                print(f"\n[{worker}] 任务 {job['id']} (第 {job['attempt']} 次): {job['url']}")
+                try:
+                    result = handler(job)
+                except Exception as e:
+                    with lock:
+                        held.pop(job['id'], None)
+                    _finish(job_queue, worker, job, error=e)
+                else:
+                    with lock:
+                        held.pop(job['id'], None)
+                    if result is not HANDED_OFF:
+                        _finish(job_queue, worker, job, result)
+        except BaseException:
+            # 中断时放回持有的任务，resume 可以立即重新领取
+            with lock:
+                jobs = list(held.values())
+            for job in jobs:
+                job_queue.release(job, worker)
+            raise
+        finally:
+            stop.set()
+            heartbeat_thread.join()
+
+
+def run_workers(queue, handler, workers=1, queue_file=QUEUE_FILE, on_handoff=None, max_handoff=1,
+                on_event=None, initializer=None, summary=None, poll_interval=5, **queue_options):
+    """
+    启动 workers 个工作进程处理队列，等待全部结束后打印统计，返回各状态的任务数
+
+    handler 需要是模块级函数，以便在子进程中使用。
+    传入 on_handoff 时，handler 可以返回 job['handoff'](数据) 把任务交给本进程：本进程接管任务
+    （续约，中断时放回），在后台线程中调用 on_handoff(job, 数据)，之后（可以在其他线程中）调用
+    job['finish'](result) 或 job['finish'](error=异常) 报告结果，只有第一次调用有效。
+    同时交给本进程的任务最多 max_handoff 个，工作进程由此与本进程的处理速度保持一致。
+    传入 on_event 时，工作进程中调用 initializer(send)（需要是模块级函数），之后 send(事件)
+    发送的事件（可以 pickle 的字典）由本进程的后台线程依次交给 on_event，多个进程的进度等
+    由此在本进程中统一处理；工作进程领取任务时还会发送 {'status': 'queued', 'count': 等待中的任务数}。
+    summary(results) 在结束时以本次完成的任务的结果列表调用。
+    """
+
+    start = time.time()
+    worker = f"{socket.gethostname()}:{os.getpid()}"
+    channel = None
+    with JobQueue(queue_file, **queue_options) as job_queue:
+        held = {}
+        lock = threading.Lock()
+        stop = threading.Event()
+        threads = [threading.Thread(target=_keep_alive, args=(job_queue, worker, held, lock, stop), daemon=True)]
+
+        if on_handoff or on_event:
+            channel = (multiprocessing.Queue(), multiprocessing.Semaphore(max_handoff) if on_handoff else None)
+            messages, slots = channel
+
+            def finish(job, result=None, error=None):
+                with lock:
+                    if held.pop(job['id'], None) is None:
+                        return
+                slots.release()
+                _finish(job_queue, worker, job, result, error)
+
+            def receive():
+                for kind, child, job, payload in iter(messages.get, None):
+                    if kind == 'event':
+                        if on_event:
+                            on_event(payload)
+                        continue
+                    if not job_queue.transfer(job, child, worker):
+                        # 任务已被放回（如工作进程被判定为已退出）
+                        slots.release()
+                        continue
+                    job['finish'] = lambda result=None, error=None, job=job: finish(job, result, error)
+                    with lock:
+                        held[job['id']] = job
+                    try:
+                        on_handoff(job, payload)
+                    except Exception as e:
+                        finish(job, error=e)
+
+            threads.append(threading.Thread(target=receive, daemon=True))
+
+        processes = [
+            multiprocessing.Process(target=run_worker,
+                                    args=(queue, handler, queue_file, poll_interval, channel, initializer),
+                                    kwargs=queue_options)
+            for _ in range(workers if workers > 1 else 0)
+        ]
+        try:
+            # 先启动工作进程再启动本进程的线程，fork 时不会复制其他线程持有的锁
+            for process in processes:
+                process.start()
+            for thread in threads:
+                thread.start()
+            if not processes:
+                run_worker(queue, handler, queue_file, poll_interval, channel, **queue_options)
+            for process in processes:
+                process.join()
+        except BaseException:
+            # 中断时放回交给本进程的任务
+            with lock:
+                jobs = list(held.values())
+            for job in jobs:
+                job_queue.release(job, worker)
+            raise
+        finally:
+            if channel:
+                messages.put(None)
+            stop.set()
+            for thread in threads:
+                if thread.is_alive():
+                    thread.join()
+
+        counts = job_queue.counts(queue)
+        print(f"\n队列 {queue}: 完成 {counts[DONE]}，失败 {counts[FAILED]}，"
+              f"待运行 {counts[PENDING]}，运行中 {counts[RUNNING]}")
+        for url, error in job_queue.failures(queue):
+            print(f"失败: {url} {error}")
+        if summary:
+            summary(job_queue.results(queue, start))
+    return counts
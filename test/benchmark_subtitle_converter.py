@@ -0,0 +1,118 @@
+import re
+import time
+from subtitle_converter import SubtitleConverter, LINE_TIMESTAMP
+
+
+def legacy_is_timestamp_line(line):
+    """旧版时间轴判断（每行 4 次 re.match），作为基准"""
+    line = line.strip()
+    srt_pattern = r'^\d{2}:\d{2}:\d{2},\d{3}\s*-->\s*\d{2}:\d{2}:\d{2},\d{3}$'
+    vtt_pattern = r'^\d{2}:\d{2}:\d{2}\.\d{3}\s*-->\s*\d{2}:\d{2}:\d{2}\.\d{3}$'
+    complex_pattern = r'^\d{2}:\d{2}:\d{2}\.\d{3}\s*-->\s*\d{2}:\d{2}:\d{2}\.\d{3}\s*align:start\s*position:\d+%$'
+    simple_pattern = r'^\[?\(?\d{2}:\d{2}\]?\)?$'
+    return bool(
+        re.match(srt_pattern, line) or
+        re.match(vtt_pattern, line) or
+        re.match(complex_pattern, line) or
+        re.match(simple_pattern, line)
+    )
+
+
+def legacy_replace_html_entities(text):
+    """旧版HTML实体替换（14 次 str.replace + 数字实体 re.sub），作为基准"""
+    html_entities = {
+        '&nbsp;': ' ', '&amp;': '&', '&lt;': '<', '&gt;': '>',
+        '&quot;': '"', '&apos;': "'", '&#39;': "'", '&ldquo;': '"',
+        '&rdquo;': '"', '&lsquo;': "'", '&rsquo;': "'", '&hellip;': '…',
+        '&mdash;': '—', '&ndash;': '–',
+    }
+    for entity, char in html_entities.items():
+        text = text.replace(entity, char)
+    return re.sub(r'&#(\d+);', lambda m: chr(int(m.group(1))), text)
+
+
+def make_entity_heavy_captions(count=20000):
+    """生成实体密集的 YouTube 字幕文本"""
+    return [
+        f"&gt;&gt; SPEAKER {i}: it&#39;s &quot;really&quot; good &amp; "
+        f"we&#39;re here&hellip; [&nbsp;Music&nbsp;] &lt;{i}&gt;"
+        for i in range(count)
+    ]
+
+
+def make_auto_caption_vtt(cues=20000):
+    """生成类似 YouTube 自动字幕的 VTT 行"""
+    lines = ['WEBVTT', 'Kind: captions', 'Language: en', '']
+    for i in range(cues):
+        start = i * 2
+        h, m, s = start // 3600, start // 60 % 60, start % 60
+        lines.append(f"{h:02d}:{m:02d}:{s:02d}.280 --> {h:02d}:{m:02d}:{s + 1:02d}.550 align:start position:0%")
+        lines.append(f"so<00:00:00.640><c> this</c><00:00:00.880><c> is</c> line {i} &amp; more")
+        lines.append("")
+    return lines
+
+
+def bench(name, func, lines, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for line in lines:
+            func(line)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    print(f"{name:<12} {best * 1000:8.1f} ms  {len(lines) / best / 1e6:6.2f} M行/秒")
+    return best
+
+
+def main():
+    converter = SubtitleConverter()
+    lines = make_auto_caption_vtt()
+
+    # 先确认新旧实现对所有旧格式的判断一致
+    samples = lines + [
+        '00:00:01,000 --> 00:00:02,000',
+        '00:00:01.000 --> 00:00:02.000',
+        '00:00:01.000-->00:00:02.000 align:start position:12%',
+        '[01:23]', '(01:23)', '01:23', '123', 'hello: world',
+    ]
+    for line in samples:
+        assert legacy_is_timestamp_line(line) == converter.is_timestamp_line(line), line
+
+    print(f"时间轴行分类 ({len(lines)} 行):")
+    old = bench('旧实现', legacy_is_timestamp_line, lines)
+    classify_line = converter.classify_line
+    new = bench('新实现', lambda line: classify_line(line.strip()) == LINE_TIMESTAMP, lines)
+    print(f"加速比: {old / new:.1f}x")
+
+    texts = make_entity_heavy_captions()
+    for text in texts[:100]:
+        assert legacy_replace_html_entities(text) == converter._replace_html_entities(text), text
+    # 每个实体只解码一次（旧实现会把 &amp;lt; 解码为 <）
+    for text, expected in (('&amp;lt;', '&lt;'), ('&amp;#39;', '&#39;'), ('&#38;amp;', '&amp;'), ('&#x26;lt;', '&lt;')):
+        assert converter._replace_html_entities(text) == expected, text
+
+    # 实际字幕中大部分行没有实体，可直接跳过
+    mixed = [text if i % 5 == 0 else f"so this is a normal caption line {i}" for i, text in enumerate(texts)]
+    for name, samples in (('实体密集', texts), ('实际混合', mixed)):
+        print(f"\nHTML实体替换 - {name} ({len(samples)} 条):")
+        old = bench('旧实现', legacy_replace_html_entities, samples)
+        new = bench('新实现', converter._replace_html_entities, samples)
+        print(f"加速比: {old / new:.1f}x")
+
+    # 旧流程每行替换一次、合并后再替换一次；新流程每条字幕只替换一次
+    def legacy_per_cue(cue):
+        return legacy_replace_html_entities(' '.join(legacy_replace_html_entities(line) for line in cue))
+
+    def new_per_cue(cue):
+        return converter._replace_html_entities(' '.join(cue))
+
+    for name, samples in (('实体密集', texts), ('实际混合', mixed)):
+        cues = [samples[i:i + 2] for i in range(0, len(samples), 2)]
+        print(f"\nHTML实体替换 - 每条字幕，{name} ({len(cues)} 条):")
+        old = bench('旧实现', legacy_per_cue, cues)
+        new = bench('新实现', new_per_cue, cues)
+        print(f"加速比: {old / new:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+import json
+import os
+import re
+import tempfile
+
+# 默认保存目录，位于输出目录中
+STORE_DIRNAME = '.comment_store'
+
+# 保存到评论库中的字段
+STORE_FIELDS = ('id', 'parent', 'author', 'timestamp', 'text', 'like_count', 'reply_count')
+
+_UNSAFE_CHARS_RE = re.compile(r'[^\w.-]')
+
+
+class CommentStore:
+    """按视频保存已获取的评论
+
+    每个视频对应两个文件：<视频ID>.jsonl 依次追加保存评论（每行一条），
+    <视频ID>.state.json 记录最新评论时间和所有已见过的评论ID，用于增量刷新时判断从哪里停止。
+    因数量限制提前停止的刷新没有与之前保存的评论衔接，这次获取的评论ID另外记入 incomplete_ids，
+    不能作为停止位置；之后某次刷新衔接上（或获取到最后一条评论）时清空。
+    状态文件通过临时文件 + os.replace 原子写入。
+    """
+
+    def __init__(self, store_dir):
+        self.store_dir = store_dir
+        os.makedirs(store_dir, exist_ok=True)
+
+    def _path(self, video_id, suffix):
+        return os.path.join(self.store_dir, _UNSAFE_CHARS_RE.sub('_', video_id) + suffix)
+
+    def comments_file(self, video_id):
+        """评论 JSONL 文件路径"""
+        return self._path(video_id, '.jsonl')
+
+    def load_state(self, video_id):
+        """
+        返回 {'newest_timestamp': 最新评论时间或 None, 'seen_ids': 已见过的评论ID集合,
+        'incomplete_ids': 尚未与之前的评论衔接的评论ID集合}
+        """
+        try:
+            with open(self._path(video_id, '.state.json'), 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return {'newest_timestamp': None, 'seen_ids': set(), 'incomplete_ids': set()}
+        return {
+            'newest_timestamp': state.get('newest_timestamp'),
+            'seen_ids': set(state.get('seen_ids', ())),
+            'incomplete_ids': set(state.get('incomplete_ids', ()))
+        }
+
+    def add(self, video_id, comments, state=None, complete=True):
+        """
+        追加新评论并更新状态，返回更新后的状态；state 为 load_state 的结果，省略时重新读取。
+        complete 为 False 表示这批评论没有与之前保存的评论衔接（刷新因数量限制提前停止）。
+        """
+        state = state or self.load_state(video_id)
+        seen_ids = state['seen_ids']
+        incomplete_ids = set() if complete else state['incomplete_ids']
+        newest_timestamp = state['newest_timestamp']
+
+        with open(self.comments_file(video_id), 'a', encoding='utf-8', buffering=1024 * 1024) as f:
+            for comment in comments:
+                comment_id = comment.get('id')
+                if comment_id in seen_ids:
+                    continue
+                if comment_id is not None:
+                    seen_ids.add(comment_id)
+                    if not complete:
+                        incomplete_ids.add(comment_id)
+                timestamp = comment.get('timestamp')
+                if timestamp and (newest_timestamp is None or timestamp > newest_timestamp):
+                    newest_timestamp = timestamp
+                f.write(json.dumps({field: comment.get(field) for field in STORE_FIELDS}, ensure_ascii=False) + '\n')
+
+        state = {'newest_timestamp': newest_timestamp, 'seen_ids': seen_ids, 'incomplete_ids': incomplete_ids}
+        state_file = self._path(video_id, '.state.json')
+        fd, temp_file = tempfile.mkstemp(suffix='.tmp', dir=self.store_dir)
+        with open(fd, 'w', encoding='utf-8') as f:
+            json.dump({'newest_timestamp': newest_timestamp, 'seen_ids': sorted(seen_ids),
+                       'incomplete_ids': sorted(incomplete_ids)}, f)
+        os.replace(temp_file, state_file)
+        return state
+
+    def iter_comments(self, video_id):
+        """按保存顺序逐条读取评论"""
+        try:
+            f = open(self.comments_file(video_id), 'r', encoding='utf-8')
+        except FileNotFoundError:
+            return
+        with f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
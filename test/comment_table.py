@@ -0,0 +1,273 @@
+import argparse
+import heapq
+import json
+from array import array
+from collections import Counter
+from datetime import datetime
+
+
+def format_timestamp(timestamp):
+    """格式化时间戳"""
+    if not timestamp:
+        return "未知时间"
+    try:
+        return datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d %H:%M:%S')
+    except (TypeError, ValueError, OverflowError, OSError):
+        return str(timestamp)
+
+
+def iter_threads(comments):
+    """将按 yt-dlp 顺序排列的评论（顶层评论之后紧跟它的回复）逐个分组为评论串
+
+    生成 (顶层评论, [(层数, 回复), ...])，只保留当前评论串。
+    不属于当前评论串的回复单独作为一个评论串。
+    """
+    root = None
+    replies = []
+    depths = {}
+    for comment in comments:
+        parent = comment.get('parent') or 'root'
+        if root is not None and parent in depths:
+            depth = depths[parent] + 1
+            replies.append((depth, comment))
+            if comment.get('id') is not None:
+                depths[comment['id']] = depth
+            continue
+        if root is not None:
+            yield root, replies
+        root = comment
+        replies = []
+        depths = {comment.get('id'): 0}
+    if root is not None:
+        yield root, replies
+
+
+def stream_top_threads(comments, k=10):
+    """从评论流中选出互动最多的 k 个评论串，返回 [(互动数, 顶层评论, [(层数, 回复), ...]), ...]
+
+    互动数的计算与 CommentTable.top_threads 相同。只保留大小为 k 的堆，
+    内存占用与评论总数无关，互动数相同时排在前面的评论串优先。
+    """
+    heap = []
+    for number, (root, replies) in enumerate(iter_threads(comments)):
+        engagement = (root.get('like_count') or 0) + (root.get('reply_count') or 0)
+        engagement += sum(reply.get('like_count') or 0 for depth, reply in replies)
+        item = (engagement, -number, root, replies)
+        if len(heap) < k:
+            heapq.heappush(heap, item)
+        elif item[:2] > heap[0][:2]:
+            heapq.heapreplace(heap, item)
+    return [(engagement, root, replies) for engagement, number, root, replies in sorted(heap, key=lambda item: item[:2], reverse=True)]
+
+
+class CommentTable:
+    """列式存储的评论表
+
+    时间戳、点赞数、回复数分别存放在 array 中，作者名只保存一份（每条评论记录作者序号），
+    所有评论内容拼接在同一个字符串里。时间等字段在输出时才格式化，
+    按点赞排序、按小时统计、活跃作者等查询直接在整列上进行，不为每条评论创建字典。
+    回复通过 parents 列记录所回复评论的序号（顶层评论为 -1），用于重建评论串。
+    父评论不在表中的回复 parents 同样为 -1，原始的父评论ID另外保存，输出时原样写出。
+    """
+
+    def __init__(self):
+        self.timestamps = array('q')
+        self.likes = array('q')
+        self.replies = array('q')
+        self.parents = array('q')
+        self.ids = []
+        self.author_ids = array('l')
+        self.authors = []
+        self._author_index = {}
+        self._id_index = {}
+        # 父评论尚未出现的回复: 父评论ID -> [回复序号]，以及反向的 回复序号 -> 父评论ID
+        self._orphans = {}
+        self._orphan_parents = {}
+        self._text_ends = array('q')
+        self._text = ''
+        self._pending = []
+        self._length = 0
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def __getitem__(self, index):
+        """返回第 index 条评论的输出格式字典"""
+        if index < 0:
+            index += len(self.timestamps)
+        parent = self.parents[index]
+        return {
+            'id': self.ids[index],
+            'parent': self.ids[parent] if parent >= 0 else self._orphan_parents.get(index, 'root'),
+            'author': self.authors[self.author_ids[index]],
+            'time': format_timestamp(self.timestamps[index]),
+            'text': self.text(index),
+            'like_count': self.likes[index],
+            'reply_count': self.replies[index]
+        }
+
+    def __iter__(self):
+        for index in range(len(self.timestamps)):
+            yield self[index]
+
+    def __repr__(self):
+        return f"<CommentTable {len(self)} comments, {len(self.authors)} authors>"
+
+    def append(self, author, timestamp, text, like_count=0, reply_count=0, comment_id=None, parent='root'):
+        """追加一条评论，parent 为所回复评论的ID，顶层评论为 'root'"""
+        index = len(self.timestamps)
+        self.ids.append(comment_id)
+        if comment_id is not None:
+            self._id_index[comment_id] = index
+            # 先于父评论出现的回复在这里补上父评论序号
+            for orphan in self._orphans.pop(comment_id, ()):
+                self.parents[orphan] = index
+                del self._orphan_parents[orphan]
+        if parent and parent != 'root':
+            parent_index = self._id_index.get(parent, -1)
+            if parent_index < 0:
+                self._orphans.setdefault(parent, []).append(index)
+                self._orphan_parents[index] = parent
+            self.parents.append(parent_index)
+        else:
+            self.parents.append(-1)
+        author_id = self._author_index.get(author)
+        if author_id is None:
+            author_id = self._author_index[author] = len(self.authors)
+            self.authors.append(author)
+        self.author_ids.append(author_id)
+        self.timestamps.append(int(timestamp or 0))
+        self.likes.append(like_count or 0)
+        self.replies.append(reply_count or 0)
+        self._pending.append(text)
+        self._length += len(text)
+        self._text_ends.append(self._length)
+
+    def text(self, index):
+        """获取第 index 条评论的内容"""
+        if self._pending:
+            # 新追加的内容在首次读取时合并进缓冲区
+            self._text += ''.join(self._pending)
+            self._pending = []
+        start = self._text_ends[index - 1] if index > 0 else 0
+        return self._text[start:self._text_ends[index]]
+
+    def top_by_likes(self, k=100):
+        """点赞最多的 k 条评论序号，按点赞数从高到低"""
+        return heapq.nlargest(k, range(len(self.likes)), key=self.likes.__getitem__)
+
+    def per_hour(self):
+        """每小时的评论数，返回 [(小时开始的时间戳, 评论数), ...]，按时间排序，不含未知时间的评论"""
+        counts = Counter(timestamp // 3600 for timestamp in self.timestamps if timestamp)
+        return [(hour * 3600, count) for hour, count in sorted(counts.items())]
+
+    def top_authors(self, k=10):
+        """评论最多的 k 个作者，返回 [(作者, 评论数), ...]"""
+        authors = self.authors
+        return [(authors[author_id], count) for author_id, count in Counter(self.author_ids).most_common(k)]
+
+    def children(self):
+        """重建回复树，返回 {评论序号: [直接回复的序号, ...]}，只扫描一遍"""
+        children = {}
+        for index, parent in enumerate(self.parents):
+            if parent >= 0:
+                children.setdefault(parent, []).append(index)
+        return children
+
+    def thread_roots(self):
+        """每条评论所在评论串的顶层评论序号
+
+        沿 parents 向上查找，已确定的结果直接复用，每条评论只处理一次。
+        父评论始终没有出现的回复作为独立的评论串。
+        """
+        parents = self.parents
+        roots = array('q', [-1]) * len(parents)
+        for index in range(len(parents)):
+            path = []
+            current = index
+            while roots[current] < 0 and parents[current] >= 0:
+                path.append(current)
+                current = parents[current]
+            root = roots[current] if roots[current] >= 0 else current
+            roots[current] = root
+            for node in path:
+                roots[node] = root
+        return roots
+
+    def top_threads(self, k=10):
+        """互动最多的 k 个评论串，返回 [(顶层评论序号, 互动数, [回复序号, ...]), ...]
+
+        互动数为评论串中所有评论的点赞数之和加上顶层评论的回复数。
+        先按列累加每个评论串的互动数，再用大小为 k 的堆选出前 k 个，不对全部评论排序。
+        """
+        roots = self.thread_roots()
+        likes = self.likes
+        scores = array('q', self.replies)
+        for index, root in enumerate(roots):
+            scores[root] += likes[index]
+        top = heapq.nlargest(k, (index for index, root in enumerate(roots) if index == root), key=scores.__getitem__)
+
+        replies = {root: [] for root in top}
+        for index, root in enumerate(roots):
+            if index != root and root in replies:
+                replies[root].append(index)
+        return [(root, scores[root], replies[root]) for root in top]
+
+    def depth(self, index):
+        """评论在回复树中的层数，顶层评论为 0"""
+        depth = 0
+        parent = self.parents[index]
+        while parent >= 0:
+            depth += 1
+            parent = self.parents[parent]
+        return depth
+
+    @classmethod
+    def from_comments(cls, comments):
+        """从 yt-dlp 返回的评论（或评论库中保存的评论）建立评论表"""
+        table = cls()
+        append = table.append
+        for comment in comments:
+            append(
+                comment.get('author') or '未知作者',
+                comment.get('timestamp'),
+                comment.get('text') or '',
+                comment.get('like_count'),
+                comment.get('reply_count'),
+                comment.get('id'),
+                comment.get('parent') or 'root'
+            )
+        return table
+
+    @classmethod
+    def from_jsonl(cls, input_file):
+        """从评论库的 JSONL 文件建立评论表"""
+        with open(input_file, 'r', encoding='utf-8') as f:
+            return cls.from_comments(json.loads(line) for line in f if line.strip())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="评论统计")
+    parser.add_argument("file", help="评论库中的 JSONL 文件（out/.comment_store/视频ID.jsonl）")
+    parser.add_argument("--top", "-n", type=int, default=10, help="显示条数")
+    args = parser.parse_args()
+
+    table = CommentTable.from_jsonl(args.file)
+    print(f"共 {len(table)} 条评论，{len(table.authors)} 个作者")
+
+    print(f"\n点赞最多的 {args.top} 条评论:")
+    for index in table.top_by_likes(args.top):
+        comment = table[index]
+        print(f"{comment['like_count']:>8}  {comment['author']}: {comment['text'][:60]}")
+
+    print(f"\n评论最多的 {args.top} 个作者:")
+    for author, count in table.top_authors(args.top):
+        print(f"{count:>8}  {author}")
+
+    print(f"\n评论最多的 {args.top} 个小时:")
+    for hour, count in sorted(table.per_hour(), key=lambda item: item[1], reverse=True)[:args.top]:
+        print(f"{count:>8}  {datetime.fromtimestamp(hour).strftime('%Y-%m-%d %H:00')}")
+
+
+if __name__ == "__main__":
+    main()
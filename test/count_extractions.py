@@ -0,0 +1,144 @@
+import os
+import shutil
+import sys
+import tempfile
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import yt_dlp
+from yt_dlp.extractor.common import InfoExtractor
+import video_subtitle_extractor
+import extract_subtitles
+# 共享模块（如 info_cache）位于仓库根目录
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from info_cache import info_cache
+
+# 每次解析（_real_extract 调用）: (视频ID, 是否获取评论) -> 次数
+# 评论获取与字幕流程并行，可能先把信息写入缓存，因此运行时不获取评论，只统计字幕流程
+EXTRACTIONS = Counter()
+# 字幕文件请求: 视频ID -> 次数
+SUBTITLE_REQUESTS = Counter()
+
+VIDEO_IDS = ['stubvideo01', 'stubvideo02', 'stubvideo03']
+
+
+class _SubtitleHandler(BaseHTTPRequestHandler):
+    """返回 /<视频ID>.vtt 的字幕内容"""
+
+    def do_GET(self):
+        video_id = self.path.strip('/').rsplit('.', 1)[0]
+        SUBTITLE_REQUESTS[video_id] += 1
+        body = (f"WEBVTT\n\n00:00:01.000 --> 00:00:02.000\nhello {video_id}\n\n"
+                "00:00:02.000 --> 00:00:03.000\nsecond line\n").encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/vtt')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class StubIE(InfoExtractor):
+    """不联网的提取器，记录每个视频被解析的次数"""
+
+    _VALID_URL = r'stub://(?P<id>\w+)'
+    IE_NAME = 'stub'
+    base_url = None
+
+    def _real_extract(self, url):
+        video_id = self._match_id(url)
+        getcomments = bool(self.get_param('getcomments'))
+        EXTRACTIONS[(video_id, getcomments)] += 1
+        info = {
+            'id': video_id,
+            'title': f"stub {video_id}",
+            'duration': 3,
+            'formats': [{'url': f"{self.base_url}/{video_id}.mp4", 'format_id': 'stub', 'ext': 'mp4'}],
+            'subtitles': {'en': [{'url': f"{self.base_url}/{video_id}.vtt", 'ext': 'vtt'}]},
+        }
+        return info
+
+
+def legacy_extract(extractor, url):
+    """旧流程：check_video 解析一次后，再用 download([url]) 下载字幕（会重新解析页面）"""
+    video_info = extractor.check_video(url)
+    ydl_opts = dict(extractor.ydl_opts, subtitleslangs=['en'],
+                    outtmpl=os.path.join(extractor.output_dir, '%(id)s.%(ext)s'))
+    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        ydl.download([url])
+    return video_info
+
+
+def use_empty_cache(cache_dir):
+    """换用空的信息缓存，保证每个视频第一次都要真正解析"""
+    info_cache.cache_dir = cache_dir
+    info_cache._memory.clear()
+
+
+def count(func):
+    """对每个视频运行 func(url)，返回 (解析次数, 获取评论的解析次数, 字幕请求次数)，均按视频计"""
+    EXTRACTIONS.clear()
+    SUBTITLE_REQUESTS.clear()
+    for video_id in VIDEO_IDS:
+        func(f"stub://{video_id}")
+    return (
+        {video_id: EXTRACTIONS[(video_id, False)] for video_id in VIDEO_IDS},
+        {video_id: EXTRACTIONS[(video_id, True)] for video_id in VIDEO_IDS},
+        {video_id: SUBTITLE_REQUESTS[video_id] for video_id in VIDEO_IDS},
+    )
+
+
+def main():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _SubtitleHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    StubIE.base_url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    add_default_info_extractors = yt_dlp.YoutubeDL.add_default_info_extractors
+
+    def add_stub_first(ydl):
+        ydl.add_info_extractor(StubIE())
+        add_default_info_extractors(ydl)
+
+    yt_dlp.YoutubeDL.add_default_info_extractors = add_stub_first
+    work_dir = tempfile.mkdtemp(prefix='count_extractions_')
+    cache_dir = info_cache.cache_dir
+    try:
+        results = {}
+        for name, module in (('video_subtitle_extractor', video_subtitle_extractor),
+                             ('extract_subtitles', extract_subtitles)):
+            use_empty_cache(os.path.join(work_dir, 'info_cache', name))
+            extractor = module.SubtitleExtractor(output_dir=os.path.join(work_dir, name))
+            extractor.comments_extractor.extract_comments = lambda *args, **kwargs: None
+            subtitle_flow, comment_flow, requests = count(extractor.extract_subtitles)
+            # 每个视频只解析一次，字幕从已有的信息字典直接下载
+            assert set(subtitle_flow.values()) == {1}, subtitle_flow
+            assert set(comment_flow.values()) == {0}, comment_flow
+            assert set(requests.values()) == {1}, requests
+            for video_id in VIDEO_IDS:
+                pure_text = [f for f in os.listdir(os.path.join(work_dir, name))
+                             if f.startswith(f"{video_id}_纯文本_")]
+                assert pure_text, video_id
+            results[name] = subtitle_flow
+
+        use_empty_cache(os.path.join(work_dir, 'info_cache', 'legacy'))
+        legacy = extract_subtitles.SubtitleExtractor(output_dir=os.path.join(work_dir, 'legacy'))
+        legacy_flow, _, legacy_requests = count(lambda url: legacy_extract(legacy, url))
+        assert set(legacy_flow.values()) == {2}, legacy_flow
+        assert set(legacy_requests.values()) == {1}, legacy_requests
+    finally:
+        yt_dlp.YoutubeDL.add_default_info_extractors = add_default_info_extractors
+        info_cache.cache_dir = cache_dir
+        info_cache._memory.clear()
+        server.shutdown()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print(f"\n字幕流程每个视频的解析次数 ({len(VIDEO_IDS)} 个视频):")
+    for name, flow in results.items():
+        print(f"{name:<26} {sum(flow.values()) / len(flow):.0f} 次")
+    print(f"{'旧流程 (download([url]))':<26} {sum(legacy_flow.values()) / len(legacy_flow):.0f} 次")
+
+
+if __name__ == "__main__":
+    main()
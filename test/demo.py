@@ -1,6 +1,11 @@
 import yt_dlp
 import os
+import sys
 from datetime import datetime
+# 共享模块（如 info_cache）位于仓库根目录
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from info_cache import info_cache
+from download_progress import download_progress
 
 class VideoDownloader:
     def __init__(self):
@@ -15,26 +20,14 @@ class VideoDownloader:
             'outtmpl': os.path.join(self.output_dir, '%(title)s.%(ext)s'),  # 输出模板
             'quiet': False,  # 显示下载进度
             'no_warnings': True,
-            'progress_hooks': [self._progress_hook]  # 进度回调
+            'progress_hooks': [download_progress.hook]  # 进度回调，按固定频率汇总输出
         }
     
-    def _progress_hook(self, d):
-        """下载进度回调"""
-        if d['status'] == 'downloading':
-            # 计算下载进度
-            if 'total_bytes' in d:
-                percent = d['downloaded_bytes'] / d['total_bytes'] * 100
-                print(f"\r下载进度: {percent:.1f}%", end='', flush=True)
-            elif 'downloaded_bytes' in d:
-                print(f"\r已下载: {d['downloaded_bytes'] / 1024 / 1024:.1f}MB", end='', flush=True)
-        elif d['status'] == 'finished':
-            print("\n下载完成！")
-    
     def check_video(self, video_url):
         """检查视频信息"""
         try:
             with yt_dlp.YoutubeDL({'quiet': True}) as ydl:
-                info = ydl.extract_info(video_url, download=False)
+                info = info_cache.extract_info(ydl, video_url, require=('formats',))
                 return {
                     'supported': True,
                     'title': info.get('title', 'unknown_video'),
@@ -84,7 +77,7 @@ class VideoDownloader:
             
             # 开始下载
             print("\n开始下载视频...")
-            with yt_dlp.YoutubeDL(self.ydl_opts) as ydl:
+            with download_progress, yt_dlp.YoutubeDL(self.ydl_opts) as ydl:
                 ydl.download([video_url])
             
             return True
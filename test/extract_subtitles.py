@@ -1,24 +1,30 @@
 import yt_dlp
 import os
+import sys
 from datetime import datetime
 from subtitle_converter import SubtitleConverter
+from subtitle_track import SubtitleTrack
 from youtube_comments_extractor import YouTubeCommentsExtractor
+from video_subtitle_extractor import parse_args, run_batch
+# 共享模块（如 info_cache）位于仓库根目录
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from info_cache import info_cache
 
 class SubtitleExtractor:
-    def __init__(self):
+    def __init__(self, output_dir='out', timestamp=None):
         self.ydl_opts = {
             'writesubtitles': True,
             'writeautomaticsub': True,
-            'subtitlesformat': 'srt',
+            'subtitlesformat': 'srt/vtt/best',  # 优先选择可以直接解析的格式
             'skip_download': True,  # 只下载字幕，不下载视频
             'quiet': True,
             'no_warnings': True
         }
-        self.timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        self.timestamp = timestamp or datetime.now().strftime('%Y%m%d_%H%M%S')
         self.converter = SubtitleConverter()
-        self.comments_extractor = YouTubeCommentsExtractor(self.timestamp)  # 添加评论提取器
+        self.comments_extractor = YouTubeCommentsExtractor(self.timestamp, output_dir)  # 添加评论提取器
         # 创建输出目录
-        self.output_dir = 'out'
+        self.output_dir = output_dir
         if not os.path.exists(self.output_dir):
             os.makedirs(self.output_dir)
     
@@ -33,8 +39,8 @@ class SubtitleExtractor:
         """检查视频支持情况和字幕信息"""
         try:
             with yt_dlp.YoutubeDL(self.ydl_opts) as ydl:
-                # 一次性获取所有信息
-                info = ydl.extract_info(video_url, download=False)
+                # 一次性获取所有信息，缓存中的信息未过期时不再解析页面
+                info = info_cache.extract_info(ydl, video_url, require=('formats',))
                 
                 # 获取字幕信息
                 has_manual_subs = info.get('subtitles', {})
@@ -49,6 +55,7 @@ class SubtitleExtractor:
                     'webpage_url': info.get('webpage_url', ''),
                     'manual_subtitles': list(has_manual_subs.keys()) if has_manual_subs else [],
                     'auto_subtitles': list(has_auto_subs.keys()) if has_auto_subs else [],
+                    'info': info,  # 完整信息，后续下载字幕时直接复用，不再重新解析页面
                     'error': None
                 }
                 
@@ -158,48 +165,34 @@ class SubtitleExtractor:
                         lang_code = code
                         break
                 
-                self.ydl_opts['subtitleslangs'] = [lang_code]
-                
-                # 下载字幕
-                with yt_dlp.YoutubeDL(self.ydl_opts) as ydl:
-                    ydl.download([video_url])
+                # 在内存中获取字幕内容，不经过当前目录中的临时文件
+                subtitle_content = self._download_subtitle(video_info['info'], lang_code)
                 print("\n下载字幕结束，开始本地处理")
-
-                # 查找并处理字幕文件
-                subtitle_file = self._find_subtitle_file()
-                if subtitle_file:
-                    # 读取原始字幕
-                    with open(subtitle_file, 'r', encoding='utf-8') as f:
-                        subtitle_content = f.read()
-                    
-                    # 保存原始字幕和纯文本字幕
+                
+                if subtitle_content:
+                    # 只解析一次，原始字幕和纯文本一起写出
+                    track = SubtitleTrack.from_string(subtitle_content, self.converter)
                     original_file = self.save_file(subtitle_content, 
                                                 f"{video_info['id']}_原始字幕", 
                                                 '.srt')
-                    
-                    # 使用字幕转换器提取纯文本
-                    pure_text = self.converter.extract_pure_text(original_file)
-                    if pure_text['success']:
-                        # 删除临时文件
-                        os.remove(subtitle_file)
-                        result['subtitles'] = {
-                            'original': original_file,
-                            'pure_text': pure_text['output_file']
-                        }
-                        print(f"\n字幕已保存:")
-                        print(f"原始字幕: {original_file}")
-                        print(f"纯文本字幕: {pure_text['output_file']}")
+                    pure_text_file = os.path.join(self.output_dir,
+                                                  f"{video_info['id']}_纯文本_{self.timestamp}.txt")
+                    self.converter.write_pure_text(track.iter_text(), pure_text_file)
+                    result['subtitles'] = {
+                        'original': original_file,
+                        'pure_text': pure_text_file,
+                        'track': track
+                    }
+                    print(f"\n字幕已保存:")
+                    print(f"原始字幕: {original_file}")
+                    print(f"纯文本字幕: {pure_text_file}")
                 else:
-                    print("\n无法找到下载的字幕文件")
+                    print("\n无法获取字幕内容")
             
-            # 读取纯文本字幕内容
+            # 纯文本字幕内容直接由字幕轨道生成，不再从文件读回
             subtitle_text = None
-            if result['subtitles'] and 'pure_text' in result['subtitles']:
-                try:
-                    with open(result['subtitles']['pure_text'], 'r', encoding='utf-8') as f:
-                        subtitle_text = f.read()
-                except Exception as e:
-                    print(f"读取字幕文件时发生错误: {str(e)}")
+            if result['subtitles']:
+                subtitle_text = '\n'.join(result['subtitles']['track'].iter_text())
             
             # 获取评论
             """
@@ -242,14 +235,30 @@ class SubtitleExtractor:
         print("手动字幕:", ', '.join(info['manual_subtitles']) if info['manual_subtitles'] else "无")
         print("自动字幕:", ', '.join(info['auto_subtitles']) if info['auto_subtitles'] else "无")
     
-    def _find_subtitle_file(self):
-        """查找下载的字幕文件"""
-        for file in os.listdir():
-            if file.endswith('.srt') or file.endswith('.vtt'):
-                return file
-        return None
+    def _download_subtitle(self, info, lang_code):
+        """根据已获取的视频信息直接下载字幕，返回字幕内容"""
+        ydl_opts = dict(self.ydl_opts)
+        if lang_code:
+            ydl_opts['subtitleslangs'] = [lang_code]
+        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            requested = ydl.process_subtitles(info['id'], info.get('subtitles'), info.get('automatic_captions'))
+            if not requested:
+                return None
+            subtitle = requested.get(lang_code) or next(iter(requested.values()))
+            # 部分提取器直接提供字幕内容
+            if subtitle.get('data') is not None:
+                return subtitle['data']
+            request = yt_dlp.networking.Request(subtitle['url'], headers=subtitle.get('http_headers') or {})
+            with ydl.urlopen(request) as response:
+                return response.read().decode('utf-8', 'replace')
 
 def main():
+    # 合并输出不支持压缩，使用 --compress 时直接报错
+    args = parse_args(compress=False)
+    if args.batch:
+        run_batch(args.batch, args.workers, args.per_host, extractor_class=SubtitleExtractor)
+        return
+    
     extractor = SubtitleExtractor()
     while True:
         video_url = input("\n请输入视频URL (输入q退出): ").strip()
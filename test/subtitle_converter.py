@@ -1,34 +1,184 @@
+import hashlib
+import json
 import os
 import re
+import time
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 
+# 增量批量转换的清单文件名
+MANIFEST_FILENAME = '.subtitle_manifest.json'
+
+# 行分类结果
+LINE_BLANK = 'blank'
+LINE_INDEX = 'index'
+LINE_TIMESTAMP = 'timestamp'
+LINE_TEXT = 'text'
+
+# 所有时间轴格式合并为一个预编译正则，每行只匹配一次：
+#   SRT 格式: 00:00:00,000 --> 00:00:00,000
+#   VTT 格式: 00:00:00.000 --> 00:00:00.000
+#   以上两种后面都可以跟任意 cue 设置，如 align:start position:0%
+#   简单格式: [00:00] 或 (01:23)
+_TIMESTAMP_RE = re.compile(
+    r'\d{2}:\d{2}:\d{2}'
+    r'(?:,\d{3}\s*-->\s*\d{2}:\d{2}:\d{2},\d{3}|\.\d{3}\s*-->\s*\d{2}:\d{2}:\d{2}\.\d{3})'
+    r'(?:\s*[A-Za-z][\w-]*:\S+(?:\s+[A-Za-z][\w-]*:\S+)*)?'
+    r'|\[?\(?\d{2}:\d{2}\]?\)?'
+)
+# 时间轴行可能的首字符
+_TIMESTAMP_FIRST_CHARS = frozenset('0123456789[(')
+# 特殊标记，如<c>等
+_TAG_RE = re.compile(r'<[^>]+>')
+
+# 常见的HTML实体字符，新增实体只需在表中加一项
+_HTML_ENTITIES = {
+    'nbsp': ' ',      # 不间断空格
+    'amp': '&',       # &符号
+    'lt': '<',        # 小于号
+    'gt': '>',        # 大于号
+    'quot': '"',      # 双引号
+    'apos': "'",      # 单引号
+    'ldquo': '"',     # 左双引号
+    'rdquo': '"',     # 右双引号
+    'lsquo': "'",     # 左单引号
+    'rsquo': "'",     # 右单引号
+    'hellip': '…',    # 省略号
+    'mdash': '—',     # 破折号
+    'ndash': '–',     # 连字符
+}
+# 完整实体文本到字符的映射，如 '&amp;' -> '&'，数字实体解码后也缓存在这里
+_ENTITY_CHARS = {f'&{name};': char for name, char in _HTML_ENTITIES.items()}
+_ENTITY_CACHE_SIZE = 1024
+# 直接用 str.replace 替换的实体：除 &amp; 外的命名实体，以及字幕中常见的 &#39;。
+# 实体之间不会重叠，替换结果也不含 & 和字母数字，不会与周围文本组成新的实体，
+# 因此逐个替换与一次扫描的结果相同，又省去了每个匹配一次的 Python 回调
+_REPLACED_ENTITIES = tuple(
+    (entity, char) for entity, char in list(_ENTITY_CHARS.items()) + [('&#39;', "'")] if entity != '&amp;'
+)
+# &amp; 和其余数字实体（解码结果可能是 & 或字母数字）最后一次扫描完成，解码结果不会被再次替换：
+# &amp; / 十进制实体 &#38; / 十六进制实体 &#x26;
+_ENTITY_RE = re.compile(r'&(?:#(\d+)|#[xX]([0-9a-fA-F]+)|amp);')
+
+
+def _decode_entity(match):
+    """将单个实体替换为对应字符，无法识别的实体原样保留"""
+    entity = match.group()
+    char = _ENTITY_CHARS.get(entity)
+    if char is not None:
+        return char
+    decimal, hexadecimal = match.groups()
+    codepoint = int(decimal) if decimal is not None else int(hexadecimal, 16)
+    if codepoint > 0x10FFFF or 0xD800 <= codepoint <= 0xDFFF:
+        return entity
+    char = chr(codepoint)
+    if len(_ENTITY_CHARS) < _ENTITY_CACHE_SIZE:
+        _ENTITY_CHARS[entity] = char
+    return char
+
 class SubtitleConverter:
     def __init__(self):
         self.supported_formats = ['.srt', '.txt', '.vtt']
     
+    def classify_line(self, line):
+        """对已去除首尾空白的行做一次分类: blank / index / timestamp / text"""
+        if not line:
+            return LINE_BLANK
+        if line.isdigit():
+            return LINE_INDEX
+        # 快速路径：不以数字或括号开头、或不含冒号的行不可能是时间轴，跳过正则
+        if line[0] not in _TIMESTAMP_FIRST_CHARS or ':' not in line:
+            return LINE_TEXT
+        if _TIMESTAMP_RE.fullmatch(line):
+            return LINE_TIMESTAMP
+        return LINE_TEXT
+    
     def is_timestamp_line(self, line):
         """检查是否为时间轴行"""
-        line = line.strip()
-        # 匹配 SRT 格式时间轴: 00:00:00,000 --> 00:00:00,000
-        srt_pattern = r'^\d{2}:\d{2}:\d{2},\d{3}\s*-->\s*\d{2}:\d{2}:\d{2},\d{3}$'
-        # 匹配 VTT 格式时间轴: 00:00:00.000 --> 00:00:00.000
-        vtt_pattern = r'^\d{2}:\d{2}:\d{2}\.\d{3}\s*-->\s*\d{2}:\d{2}:\d{2}\.\d{3}$'
-        # 匹配 格式时间轴：00:00:00.280 --> 00:00:02.550 align:start position:0%
-        complex_pattern = r'^\d{2}:\d{2}:\d{2}\.\d{3}\s*-->\s*\d{2}:\d{2}:\d{2}\.\d{3}\s*align:start\s*position:\d+%$'
-        # 匹配简单时间格式: [00:00] 或 (01:23)
-        simple_pattern = r'^\[?\(?\d{2}:\d{2}\]?\)?$'
-        
-        return bool(
-            re.match(srt_pattern, line) or 
-            re.match(vtt_pattern, line) or 
-            re.match(complex_pattern, line) or 
-            re.match(simple_pattern, line)
-        )
+        return self.classify_line(line.strip()) == LINE_TIMESTAMP
     
     def is_index_line(self, line):
         """检查是否为序号行"""
         return line.strip().isdigit()
     
+    def iter_pure_text(self, input_file, chunk_size=1024 * 1024):
+        """按块读取字幕文件，逐条生成纯文本（不会一次性读入整个文件）"""
+        with open(input_file, 'r', encoding='utf-8', buffering=chunk_size) as f:
+            yield from self.iter_text_blocks(f)
+    
+    def iter_cues(self, lines):
+        """从字幕行的可迭代对象中逐条生成字幕块 (时间轴行, 纯文本, 起始行号, 结束行号)
+
+        空行、序号行和时间轴行结束当前字幕块，时间轴行之后的文本属于该时间轴；
+        没有时间轴的文本块（如纯文本文件）时间轴行为 None。起始行号为时间轴行
+        （没有时间轴时为第一行文本）的行号，结束行号为结束该字幕块的行的行号（不含），从 0 开始。
+        VTT 文件开头的 WEBVTT 头部（到第一个空行为止）不作为文本。
+        SubtitleTrack、CueIndex 和纯文本提取共用这一个解析过程。
+        """
+        current_text = []
+        timestamp = None
+        first_line = None
+        # None: 还没有遇到非空行；True: 在 WEBVTT 头部中；False: 正文
+        header = None
+        classify_line = self.classify_line
+        clean_line = self.clean_line
+        line_number = -1
+        for line_number, line in enumerate(lines):
+            line = line.strip()
+            kind = classify_line(line)
+            
+            if header is not False:
+                if header is None:
+                    if kind == LINE_BLANK:
+                        continue
+                    header = line.lstrip('\ufeff').startswith('WEBVTT')
+                    if header:
+                        continue
+                elif kind == LINE_TEXT:
+                    continue
+                else:
+                    header = False
+            
+            if kind == LINE_TEXT:
+                # 去除特殊标记（HTML实体在整条合并后只替换一次）
+                line = clean_line(line)
+                if line:
+                    if first_line is None:
+                        first_line = line_number
+                    current_text.append(line)
+                continue
+            
+            # 空行、序号行和时间轴行结束当前字幕块
+            if current_text:
+                yield timestamp, self.finish_block(current_text), first_line, line_number
+                current_text = []
+            if kind == LINE_TIMESTAMP:
+                timestamp = line
+                first_line = line_number
+            else:
+                timestamp = None
+                first_line = None
+        
+        # 处理最后一组文本
+        if current_text:
+            yield timestamp, self.finish_block(current_text), first_line, line_number + 1
+    
+    def iter_text_blocks(self, lines):
+        """从字幕行的可迭代对象中逐条生成纯文本"""
+        for timestamp, text, first_line, end_line in self.iter_cues(lines):
+            yield text
+    
+    def write_pure_text(self, blocks, output_file):
+        """将纯文本逐条写入文件，返回写入的条数"""
+        lines_count = 0
+        with open(output_file, 'w', encoding='utf-8') as f:
+            for text in blocks:
+                if lines_count:
+                    f.write('\n')
+                f.write(text)
+                lines_count += 1
+        return lines_count
+    
     def extract_pure_text(self, input_file, output_file=None):
         """从字幕文件中提取纯文本"""
         try:
@@ -45,59 +195,14 @@ class SubtitleConverter:
                 base_name = os.path.splitext(input_file)[0]
                 output_file = f"{base_name}_纯文本.txt"
             
-            pure_text_lines = []
-            current_text = []
-            
-            with open(input_file, 'r', encoding='utf-8') as f:
-                lines = f.readlines()
-            
-            skip_next_line = False
-            for i, line in enumerate(lines):
-                line = line.strip()
-                
-                # 跳过空行、序号行和时间轴行
-                if (not line or 
-                    self.is_index_line(line) or 
-                    self.is_timestamp_line(line) or
-                    skip_next_line):  # 跳过WEBVTT标记后的行
-                    if line == 'WEBVTT':
-                        skip_next_line = True
-                    else:
-                        skip_next_line = False
-                    if current_text:
-                        # 合并多行文本，去除多余空格
-                        text = ' '.join(current_text)
-                        # 去除特殊标记，如<c>等
-                        text = re.sub(r'<[^>]+>', '', text)
-                        # 替换HTML实体字符
-                        text = self._replace_html_entities(text)
-                        pure_text_lines.append(text)
-                        current_text = []
-                    continue
-                
-                # 去除特殊标记
-                line = re.sub(r'<[^>]+>', '', line)
-                # 替换HTML实体字符
-                line = self._replace_html_entities(line)
-                if line:
-                    current_text.append(line)
-            
-            # 处理最后一组文本
-            if current_text:
-                text = ' '.join(current_text)
-                text = re.sub(r'<[^>]+>', '', text)
-                text = self._replace_html_entities(text)
-                pure_text_lines.append(text)
-            
-            # 写入输出文件
-            with open(output_file, 'w', encoding='utf-8') as f:
-                f.write('\n'.join(pure_text_lines))
+            # 边读边写，内存占用与文件大小无关
+            lines_count = self.write_pure_text(self.iter_pure_text(input_file), output_file)
             
             return {
                 'success': True,
                 'input_file': input_file,
                 'output_file': output_file,
-                'lines_count': len(pure_text_lines)
+                'lines_count': lines_count
             }
             
         except Exception as e:
@@ -107,58 +212,221 @@ class SubtitleConverter:
                 'input_file': input_file
             }
     
+    def clean_line(self, line):
+        """去除单行中的特殊标记，如<c>等"""
+        if '<' in line:
+            return _TAG_RE.sub('', line)
+        return line
+    
+    def finish_block(self, current_text):
+        """合并一组文本行，去除多余空格和特殊标记
+        
+        各行的标记已由 clean_line 去除，这里在替换HTML实体后再去除一次，
+        转义的标记（如 &lt;i&gt;）解码后同样不会出现在纯文本中。
+        """
+        text = self._replace_html_entities(' '.join(current_text))
+        if '<' in text:
+            text = _TAG_RE.sub('', text)
+        return text
+    
     def _replace_html_entities(self, text):
-        """替换HTML实体字符"""
-        # 替换常见的HTML实体字符
-        html_entities = {
-            '&nbsp;': ' ',    # 不间断空格
-            '&amp;': '&',     # &符号
-            '&lt;': '<',      # 小于号
-            '&gt;': '>',      # 大于号
-            '&quot;': '"',    # 双引号
-            '&apos;': "'",    # 单引号
-            '&#39;': "'",     # 单引号的另一种写法
-            '&ldquo;': '"',   # 左双引号
-            '&rdquo;': '"',   # 右双引号
-            '&lsquo;': ''',   # 左单引号
-            '&rsquo;': ''',   # 右单引号
-            '&hellip;': '…',  # 省略号
-            '&mdash;': '—',   # 破折号
-            '&ndash;': '–',   # 连字符
-        }
-        
-        # 替换所有已知的HTML实体字符
-        for entity, char in html_entities.items():
+        """替换HTML实体字符，每个实体只解码一次（如 &amp;lt; 得到 &lt;）"""
+        if '&' not in text:
+            return text
+        for entity, char in _REPLACED_ENTITIES:
             text = text.replace(entity, char)
+        if '&#' not in text:
+            return text.replace('&amp;', '&')
+        return _ENTITY_RE.sub(_decode_entity, text)
+    
+    def convert_timed(self, input_file, output_file=None):
+        """转换单个文件并记录耗时（秒）"""
+        start = time.perf_counter()
+        result = self.extract_pure_text(input_file, output_file)
+        result['elapsed'] = time.perf_counter() - start
+        return result
+    
+    def batch_convert(self, input_dir, output_dir=None, workers=1, chunk_bytes=4 * 1024 * 1024,
+                      incremental=False):
+        """批量转换目录下的所有字幕文件
         
-        # 处理数字实体字符 (如 &#160;)
-        text = re.sub(r'&#(\d+);', lambda m: chr(int(m.group(1))), text)
+        workers 大于 1 时使用多进程并行转换，小文件按 chunk_bytes 打包成一组交给同一个进程，
+        减少进程间通信开销。结果按文件名排序返回，与串行转换的输出完全一致。
         
-        return text
-    
-    def batch_convert(self, input_dir, output_dir=None):
-        """批量转换目录下的所有字幕文件"""
+        incremental 为 True 时在输出目录维护一个清单，记录每个输入文件的大小、修改时间和内容哈希，
+        只转换有变化的文件，并删除已不存在或已过期的输出文件。
+        """
         if not os.path.exists(input_dir):
             return {'success': False, 'error': f"输入目录不存在: {input_dir}"}
         
         if output_dir and not os.path.exists(output_dir):
             os.makedirs(output_dir)
         
-        results = []
-        for file in os.listdir(input_dir):
+        manifest_file = os.path.join(output_dir or input_dir, MANIFEST_FILENAME)
+        manifest = self._load_manifest(manifest_file, input_dir) if incremental else {}
+        # 输出文件 -> 对应的输入文件
+        known_outputs = {os.path.abspath(entry['output_file']): name for name, entry in manifest.items()}
+        
+        # 同一批次使用同一个时间戳，保证串行和并行的输出文件名一致
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        jobs = []
+        for file in sorted(os.listdir(input_dir)):
             if os.path.splitext(file)[1].lower() in self.supported_formats:
                 input_file = os.path.join(input_dir, file)
+                input_key = os.path.abspath(input_file)
+                if input_key in known_outputs:
+                    continue
                 if output_dir:
                     base_name = os.path.splitext(file)[0]
-                    output_file = os.path.join(output_dir, 
-                                             f"{base_name}_纯文本_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt")
+                    output_file = os.path.join(output_dir, f"{base_name}_纯文本_{timestamp}.txt")
+                    # 其他输入目录的同名文件已使用这个输出文件名时加上序号
+                    number = 1
+                    while known_outputs.get(os.path.abspath(output_file), input_key) != input_key:
+                        number += 1
+                        output_file = os.path.join(output_dir, f"{base_name}_{number}_纯文本_{timestamp}.txt")
                 else:
                     output_file = None
-                
-                result = self.extract_pure_text(input_file, output_file)
-                results.append(result)
+                jobs.append((input_file, output_file))
+        
+        if not incremental:
+            return self._run_jobs(jobs, workers, chunk_bytes)
+        
+        # 找出内容未变化、输出仍然存在的文件，直接跳过
+        skipped = {}
+        fingerprints = {}
+        pending = []
+        for input_file, output_file in jobs:
+            entry = manifest.get(os.path.abspath(input_file))
+            fingerprint = self._fingerprint(input_file, entry)
+            fingerprints[input_file] = fingerprint
+            if (entry and entry['sha256'] == fingerprint['sha256']
+                    and os.path.exists(entry['output_file'])):
+                entry.update(fingerprint)
+                skipped[input_file] = {
+                    'success': True,
+                    'skipped': True,
+                    'input_file': input_file,
+                    'output_file': entry['output_file'],
+                    'lines_count': entry['lines_count'],
+                    'elapsed': 0.0
+                }
+            else:
+                pending.append((input_file, output_file))
+        
+        converted = {}
+        for result in self._run_jobs(pending, workers, chunk_bytes):
+            converted[result['input_file']] = result
+            if not result['success']:
+                continue
+            name = os.path.abspath(result['input_file'])
+            old_entry = manifest.get(name)
+            if old_entry and old_entry['output_file'] != result['output_file']:
+                self._remove_output(old_entry['output_file'])
+            manifest[name] = dict(fingerprints[result['input_file']],
+                                  output_file=result['output_file'],
+                                  lines_count=result['lines_count'])
+        
+        # 清理输入文件已被删除的输出，同一输出目录中其他输入目录的记录不受影响
+        input_root = os.path.abspath(input_dir)
+        current_names = {os.path.abspath(input_file) for input_file, _ in jobs}
+        for name in [name for name in manifest
+                     if os.path.dirname(name) == input_root and name not in current_names]:
+            self._remove_output(manifest.pop(name)['output_file'])
+        
+        self._save_manifest(manifest_file, manifest)
+        return [skipped.get(input_file) or converted[input_file] for input_file, _ in jobs]
+    
+    def _run_jobs(self, jobs, workers, chunk_bytes):
+        """串行或多进程执行转换任务，结果与任务顺序一致"""
+        if workers <= 1 or len(jobs) <= 1:
+            return [self.convert_timed(input_file, output_file) for input_file, output_file in jobs]
         
+        chunks = self._chunk_jobs(jobs, chunk_bytes, workers)
+        results = []
+        with ProcessPoolExecutor(max_workers=min(workers, len(chunks))) as executor:
+            # map 按提交顺序返回结果，保证结果顺序确定
+            for chunk_results in executor.map(_convert_chunk, chunks):
+                results.extend(chunk_results)
         return results
+    
+    def _fingerprint(self, input_file, entry=None):
+        """获取文件的大小、修改时间和内容哈希，大小和修改时间未变时沿用清单中的哈希"""
+        stat = os.stat(input_file)
+        fingerprint = {'size': stat.st_size, 'mtime': stat.st_mtime}
+        if entry and entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime:
+            fingerprint['sha256'] = entry['sha256']
+            return fingerprint
+        
+        digest = hashlib.sha256()
+        with open(input_file, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(block)
+        fingerprint['sha256'] = digest.hexdigest()
+        return fingerprint
+    
+    def _load_manifest(self, manifest_file, input_dir):
+        """读取增量转换清单，文件不存在或损坏时返回空清单
+        
+        清单按输入文件的绝对路径记录，多个输入目录可以共用同一个输出目录。
+        旧版（version 1）清单按文件名记录，读取时视为 input_dir 中的文件。
+        """
+        try:
+            with open(manifest_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        files = data.get('files', {})
+        if data.get('version', 1) < 2:
+            files = {os.path.abspath(os.path.join(input_dir, name)): entry for name, entry in files.items()}
+        return files
+    
+    def _save_manifest(self, manifest_file, manifest):
+        """原子写入增量转换清单"""
+        temp_file = f"{manifest_file}.{os.getpid()}.tmp"
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump({'version': 2, 'files': manifest}, f, ensure_ascii=False)
+        os.replace(temp_file, manifest_file)
+    
+    def _remove_output(self, output_file):
+        """删除过期的输出文件"""
+        try:
+            os.remove(output_file)
+        except OSError:
+            pass
+    
+    def _chunk_jobs(self, jobs, chunk_bytes, workers=1):
+        """按文件大小把任务打包，大文件单独成组
+        
+        每组的大小不超过 chunk_bytes，也不超过总大小的 1/(workers * 4)，
+        保证文件总量较小时也能分成足够多的组，让每个进程都有任务可做。
+        """
+        sizes = []
+        for job in jobs:
+            try:
+                sizes.append(os.path.getsize(job[0]))
+            except OSError:
+                sizes.append(0)
+        chunk_bytes = max(min(chunk_bytes, sum(sizes) // (workers * 4)), 1)
+        
+        chunks = []
+        current = []
+        current_bytes = 0
+        for job, size in zip(jobs, sizes):
+            if current and current_bytes + size > chunk_bytes:
+                chunks.append(current)
+                current = []
+                current_bytes = 0
+            current.append(job)
+            current_bytes += size
+        if current:
+            chunks.append(current)
+        return chunks
+
+
+def _convert_chunk(jobs):
+    """在子进程中转换一组文件"""
+    converter = SubtitleConverter()
+    return [converter.convert_timed(input_file, output_file) for input_file, output_file in jobs]
 
 def main():
     converter = SubtitleConverter()
@@ -186,15 +454,23 @@ def main():
         elif choice == '2':
             input_dir = input("\n请输入字幕文件目录: ").strip()
             output_dir = input("请输入输出目录（可选，直接回车使用原目录）: ").strip()
+            workers = input("请输入并行进程数（可选，直接回车为单进程）: ").strip()
+            incremental = input("是否只转换有变化的文件？(y/n): ").strip().lower() == 'y'
             
-            results = converter.batch_convert(input_dir, output_dir if output_dir else None)
+            results = converter.batch_convert(input_dir, output_dir if output_dir else None,
+                                              workers=int(workers) if workers.isdigit() else 1,
+                                              incremental=incremental)
             
             print("\n转换结果:")
             for result in results:
-                if result['success']:
+                if result.get('skipped'):
+                    print(f"\n跳过（未变化）: {result['input_file']}")
+                    print(f"输出: {result['output_file']}")
+                elif result['success']:
                     print(f"\n成功: {result['input_file']}")
                     print(f"输出: {result['output_file']}")
                     print(f"行数: {result['lines_count']}")
+                    print(f"耗时: {result['elapsed']:.3f}秒")
                 else:
                     print(f"\n失败: {result['input_file']}")
                     print(f"错误: {result['error']}")
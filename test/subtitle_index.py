@@ -0,0 +1,188 @@
+import argparse
+import os
+import re
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
+from subtitle_converter import SubtitleConverter
+from subtitle_track import SubtitleTrack, _CUE_TIME_RE, _to_ms
+
+# 索引文件头，后面跟 8 字节整数数组
+_INDEX_MAGIC = b'CUEIDX1\n'
+# 命令行时间参数: 秒数，或 [时:]分:秒[.毫秒]
+_TIME_ARG_RE = re.compile(r'(?:(?:(\d+):)?(\d+):)?(\d+)(?:[.,](\d{1,3}))?')
+
+
+def format_srt_time(ms):
+    """将毫秒格式化为 SRT 时间: 00:00:00,000"""
+    seconds, millis = divmod(ms, 1000)
+    minutes, seconds = divmod(seconds, 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d},{millis:03d}"
+
+
+def parse_time(value):
+    """将命令行时间参数转换为毫秒，如 4320、72:00、01:12:00、01:12:00.500"""
+    match = _TIME_ARG_RE.fullmatch(value.strip())
+    if not match:
+        raise ValueError(f"无法识别的时间: {value}")
+    hours, minutes, seconds, millis = match.groups()
+    return _to_ms(hours, minutes or 0, seconds, (millis or '0').ljust(3, '0'))
+
+
+class CueIndex:
+    """字幕时间区间索引
+
+    按开始时间排序保存所有字幕，并维护结束时间的前缀最大值。查询时两次二分
+    即可确定候选范围，字幕之间互相重叠（滚动自动字幕）时结果同样正确。
+    从文件建立的索引还记录每条字幕在文件中的字节位置，查询时只读取命中的字幕。
+    """
+
+    def __init__(self, starts, ends, offsets=None, lengths=None):
+        # 按开始时间排序，order 记录排序后的位置对应的原字幕序号
+        order = sorted(range(len(starts)), key=starts.__getitem__)
+        self.order = array('q', order)
+        self.starts = array('q', (starts[i] for i in order))
+        self.ends = array('q', (ends[i] for i in order))
+        self.max_ends = array('q')
+        max_end = -1
+        for end in self.ends:
+            max_end = max(max_end, end)
+            self.max_ends.append(max_end)
+        self.offsets = offsets
+        self.lengths = lengths
+
+    def __len__(self):
+        return len(self.starts)
+
+    def query(self, start_ms, end_ms):
+        """返回与 [start_ms, end_ms) 有重叠的字幕序号，按开始时间排序"""
+        hi = bisect_left(self.starts, end_ms)
+        # max_ends 单调不减，之前的字幕都在 start_ms 之前结束
+        lo = bisect_right(self.max_ends, start_ms, 0, hi)
+        ends = self.ends
+        order = self.order
+        return [order[i] for i in range(lo, hi) if ends[i] > start_ms]
+
+    def at(self, time_ms):
+        """返回在 time_ms 时刻正在显示的字幕序号"""
+        return self.query(time_ms, time_ms + 1)
+
+    @classmethod
+    def from_track(cls, track):
+        """为内存中的字幕轨道建立索引，查询结果为轨道中的序号"""
+        return cls(track.starts, track.ends)
+
+    @classmethod
+    def build(cls, subtitle_file, converter=None):
+        """扫描字幕文件建立索引，记录每条字幕的字节位置"""
+        converter = converter or SubtitleConverter()
+        starts, ends = array('q'), array('q')
+        offsets, lengths = array('q'), array('q')
+        # 每行的字节位置，用于把字幕块的行号换算为文件中的位置
+        line_offsets = array('q')
+
+        def iter_lines(f):
+            position = 0
+            for raw in f:
+                line_offsets.append(position)
+                position += len(raw)
+                yield raw.decode('utf-8')
+            line_offsets.append(position)
+
+        with open(subtitle_file, 'rb') as f:
+            # 与 SubtitleTrack 使用同一个解析过程，没有时间轴或文本的字幕不计入
+            for timestamp, text, first_line, end_line in converter.iter_cues(iter_lines(f)):
+                match = _CUE_TIME_RE.match(timestamp) if timestamp else None
+                if match:
+                    starts.append(_to_ms(*match.group(1, 2, 3, 4)))
+                    ends.append(_to_ms(*match.group(5, 6, 7, 8)))
+                    offsets.append(line_offsets[first_line])
+                    lengths.append(line_offsets[end_line] - line_offsets[first_line])
+        return cls(starts, ends, offsets, lengths)
+
+    @classmethod
+    def load(cls, subtitle_file, converter=None):
+        """读取字幕文件旁的 .cueidx 索引，不存在或已过期时重新建立并保存
+
+        目录只读或磁盘已满等原因无法保存时，仍返回新建立的索引。
+        """
+        index_file = subtitle_file + '.cueidx'
+        stat = os.stat(subtitle_file)
+        try:
+            with open(index_file, 'rb') as f:
+                if f.read(len(_INDEX_MAGIC)) == _INDEX_MAGIC:
+                    header = array('q')
+                    header.fromfile(f, 3)
+                    size, mtime_ns, count = header
+                    if size == stat.st_size and mtime_ns == stat.st_mtime_ns:
+                        index = cls.__new__(cls)
+                        for name in ('order', 'starts', 'ends', 'max_ends', 'offsets', 'lengths'):
+                            values = array('q')
+                            values.fromfile(f, count)
+                            setattr(index, name, values)
+                        return index
+        except (OSError, EOFError):
+            pass
+
+        index = cls.build(subtitle_file, converter)
+        try:
+            index.save(index_file, stat)
+        except OSError:
+            pass
+        return index
+
+    def save(self, index_file, stat):
+        """原子写入索引文件，stat 为对应字幕文件的状态，用于判断索引是否过期"""
+        temp_file = f"{index_file}.{os.getpid()}.tmp"
+        with open(temp_file, 'wb') as f:
+            f.write(_INDEX_MAGIC)
+            array('q', [stat.st_size, stat.st_mtime_ns, len(self)]).tofile(f)
+            for values in (self.order, self.starts, self.ends, self.max_ends, self.offsets, self.lengths):
+                values.tofile(f)
+        os.replace(temp_file, index_file)
+
+    def read_cues(self, subtitle_file, cue_numbers, converter=None):
+        """只读取指定的字幕，返回包含这些字幕的 SubtitleTrack"""
+        converter = converter or SubtitleConverter()
+        track = SubtitleTrack()
+        with open(subtitle_file, 'rb') as f:
+            for number in cue_numbers:
+                f.seek(self.offsets[number])
+                block = f.read(self.lengths[number]).decode('utf-8')
+                for cue in SubtitleTrack.from_string(block, converter):
+                    track.append(*cue)
+        return track
+
+
+def main():
+    parser = argparse.ArgumentParser(description="按时间范围输出字幕片段")
+    parser.add_argument("file", help="SRT/VTT 字幕文件")
+    parser.add_argument("start", help="开始时间，如 01:12:00 或 4320")
+    parser.add_argument("end", nargs='?', help="结束时间，省略时输出开始时间点正在显示的字幕")
+    parser.add_argument("--format", "-f", choices=['srt', 'text'], default='srt', help="输出格式")
+    args = parser.parse_args()
+
+    try:
+        start_ms = parse_time(args.start)
+        end_ms = parse_time(args.end) if args.end else start_ms + 1
+    except ValueError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+
+    index = CueIndex.load(args.file)
+    track = index.read_cues(args.file, index.query(start_ms, end_ms))
+
+    if args.format == 'text':
+        for text in track.iter_text():
+            print(text)
+    else:
+        for number, (cue_start, cue_end, text) in enumerate(track, 1):
+            print(number)
+            print(f"{format_srt_time(cue_start)} --> {format_srt_time(cue_end)}")
+            print(text)
+            print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+import re
+from array import array
+from subtitle_converter import SubtitleConverter
+
+# 解析 SRT/VTT 时间轴中的开始和结束时间，小时部分可省略
+_CUE_TIME_RE = re.compile(
+    r'(?:(\d+):)?(\d{2}):(\d{2})[,.](\d{3})\s*-->\s*(?:(\d+):)?(\d{2}):(\d{2})[,.](\d{3})'
+)
+
+
+def _to_ms(hours, minutes, seconds, millis):
+    """将时间各部分转换为整数毫秒"""
+    return ((int(hours or 0) * 60 + int(minutes)) * 60 + int(seconds)) * 1000 + int(millis)
+
+
+class SubtitleTrack:
+    """紧凑的字幕轨道
+
+    开始、结束时间以整数毫秒存放在 array 中，所有字幕文本拼接在同一个字符串里，
+    每条字幕只占用三个 8 字节整数（开始、结束、文本结束位置），不为每条字幕创建 Python 对象。
+    """
+
+    def __init__(self):
+        self.starts = array('q')
+        self.ends = array('q')
+        self._text_ends = array('q')
+        self._text = ''
+        self._pending = []
+        self._length = 0
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __getitem__(self, index):
+        """返回 (开始毫秒, 结束毫秒, 文本)"""
+        if index < 0:
+            index += len(self.starts)
+        return self.starts[index], self.ends[index], self.text(index)
+
+    def __iter__(self):
+        for index in range(len(self.starts)):
+            yield self[index]
+
+    def __repr__(self):
+        return f"<SubtitleTrack {len(self)} cues>"
+
+    def append(self, start_ms, end_ms, text):
+        """追加一条字幕"""
+        self.starts.append(start_ms)
+        self.ends.append(end_ms)
+        self._pending.append(text)
+        self._length += len(text)
+        self._text_ends.append(self._length)
+
+    def text(self, index):
+        """获取第 index 条字幕的文本"""
+        if self._pending:
+            # 新追加的文本在首次读取时合并进缓冲区
+            self._text += ''.join(self._pending)
+            self._pending = []
+        start = self._text_ends[index - 1] if index > 0 else 0
+        return self._text[start:self._text_ends[index]]
+
+    def iter_text(self):
+        """逐条生成字幕文本"""
+        for index in range(len(self.starts)):
+            yield self.text(index)
+
+    @classmethod
+    def from_lines(cls, lines, converter=None):
+        """从 SRT/VTT 字幕行解析字幕轨道，没有时间的内容（如 WEBVTT 头部）会被忽略"""
+        converter = converter or SubtitleConverter()
+        track = cls()
+        for timestamp, text, first_line, end_line in converter.iter_cues(lines):
+            match = _CUE_TIME_RE.match(timestamp) if timestamp else None
+            if match:
+                track.append(_to_ms(*match.group(1, 2, 3, 4)), _to_ms(*match.group(5, 6, 7, 8)), text)
+        return track
+
+    @classmethod
+    def from_string(cls, content, converter=None):
+        """从字幕文件内容解析字幕轨道"""
+        return cls.from_lines(content.splitlines(), converter)
+
+    @classmethod
+    def from_file(cls, input_file, converter=None):
+        """从字幕文件解析字幕轨道"""
+        with open(input_file, 'r', encoding='utf-8') as f:
+            return cls.from_lines(f, converter)
@@ -0,0 +1,223 @@
+import argparse
+import os
+import re
+import sqlite3
+import time
+from subtitle_converter import SubtitleConverter
+from subtitle_index import format_srt_time
+from subtitle_track import SubtitleTrack
+
+# 默认索引文件，保存在输出目录中
+INDEX_FILENAME = '.transcript_index.sqlite'
+
+# 输出目录中的字幕文件名: 视频ID_原始字幕_时间戳.srt / 视频ID_纯文本_时间戳.txt
+_SOURCE_RE = re.compile(r'^(?P<id>.+)_(?P<kind>原始字幕|纯文本)_(?P<ts>\d{8}_\d{6})\.(?:srt|txt)$')
+# 中日韩文字（假名、汉字、兼容汉字、谚文）逐字切分后组成二元组，其他文字按单词切分
+_CJK_RANGES = '\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uac00-\ud7af'
+_TOKEN_RE = re.compile(f'([{_CJK_RANGES}]+)|[^\\W_{_CJK_RANGES}]+')
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS videos (
+    video_id TEXT PRIMARY KEY,
+    source_file TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS cues (
+    id INTEGER PRIMARY KEY,
+    video_id TEXT NOT NULL,
+    start_ms INTEGER,
+    end_ms INTEGER,
+    text TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS cues_video ON cues (video_id);
+CREATE VIRTUAL TABLE IF NOT EXISTS cue_tokens USING fts5 (tokens);
+'''
+
+
+def tokenize(text):
+    """切分用于建立索引的词
+
+    中日韩文字按相邻两字组成二元组，每段文字的最后一个字单独再收录一次，
+    这样单字查询也能通过前缀匹配找到。
+    """
+    tokens = []
+    for match in _TOKEN_RE.finditer(text.lower()):
+        run = match.group()
+        if not match.group(1):
+            tokens.append(run)
+            continue
+        for i in range(len(run) - 1):
+            tokens.append(run[i:i + 2])
+        tokens.append(run[-1])
+    return tokens
+
+
+def _query_terms(query):
+    """将查询切分为 FTS5 查询条件，单个汉字使用前缀匹配"""
+    terms = []
+    for match in _TOKEN_RE.finditer(query.lower()):
+        run = match.group()
+        if not match.group(1):
+            terms.append(f'"{run}"')
+        elif len(run) == 1:
+            terms.append(f'"{run}"*')
+        else:
+            terms.extend(f'"{run[i:i + 2]}"' for i in range(len(run) - 1))
+    return terms
+
+
+def _normalize(text):
+    """小写并合并空白，用于短语的最终核对"""
+    return ' '.join(text.lower().split())
+
+
+class TranscriptIndex:
+    """输出目录（包括子目录）中所有字幕的全文索引
+
+    索引保存在 SQLite 数据库中（FTS5），按视频增量更新：新增或修改一个视频的字幕
+    只会重写这个视频的记录。查询结果包含视频ID和字幕时间。
+    """
+
+    def __init__(self, index_file):
+        self.index_file = index_file
+        self.conn = sqlite3.connect(index_file)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.executescript(_SCHEMA)
+        self.converter = SubtitleConverter()
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _find_sources(self, directory):
+        """为每个视频找到最新的字幕文件，优先使用带时间轴的原始字幕
+
+        包括子目录（如批量下载的 batch_时间戳/worker_NN/），隐藏目录（如评论库、索引）除外。
+        """
+        sources = {}
+        for root, dirs, files in os.walk(directory):
+            dirs[:] = sorted(name for name in dirs if not name.startswith('.'))
+            for file in sorted(files):
+                match = _SOURCE_RE.match(file)
+                if not match:
+                    continue
+                # 同一时间戳下原始字幕排在纯文本前面
+                key = (match.group('ts'), match.group('kind') == '原始字幕')
+                video_id = match.group('id')
+                if video_id not in sources or key > sources[video_id][0]:
+                    sources[video_id] = (key, os.path.join(root, file))
+        return {video_id: path for video_id, (key, path) in sources.items()}
+
+    def update(self, directory):
+        """增量更新索引，返回 {'added': 新增或更新的视频数, 'removed': 删除的视频数}"""
+        sources = self._find_sources(directory)
+        indexed = {
+            row[0]: row[1:]
+            for row in self.conn.execute('SELECT video_id, source_file, size, mtime FROM videos')
+        }
+
+        added = 0
+        for video_id, source_file in sorted(sources.items()):
+            stat = os.stat(source_file)
+            if indexed.get(video_id) == (source_file, stat.st_size, stat.st_mtime):
+                continue
+            self.add_file(video_id, source_file, stat)
+            added += 1
+
+        removed = [video_id for video_id in indexed if video_id not in sources]
+        with self.conn:
+            for video_id in removed:
+                self._remove_video(video_id)
+        return {'added': added, 'removed': len(removed)}
+
+    def add_file(self, video_id, source_file, stat=None):
+        """索引单个视频的字幕文件，替换该视频已有的记录"""
+        stat = stat or os.stat(source_file)
+        if source_file.endswith('.srt'):
+            cues = SubtitleTrack.from_file(source_file, self.converter)
+        else:
+            # 纯文本没有时间轴，每行作为一条记录
+            cues = ((None, None, text) for text in self.converter.iter_pure_text(source_file))
+
+        with self.conn:
+            self._remove_video(video_id)
+            for start_ms, end_ms, text in cues:
+                cursor = self.conn.execute(
+                    'INSERT INTO cues (video_id, start_ms, end_ms, text) VALUES (?, ?, ?, ?)',
+                    (video_id, start_ms, end_ms, text)
+                )
+                self.conn.execute(
+                    'INSERT INTO cue_tokens (rowid, tokens) VALUES (?, ?)',
+                    (cursor.lastrowid, ' '.join(tokenize(text)))
+                )
+            self.conn.execute(
+                'INSERT INTO videos (video_id, source_file, size, mtime) VALUES (?, ?, ?, ?)',
+                (video_id, source_file, stat.st_size, stat.st_mtime)
+            )
+
+    def _remove_video(self, video_id):
+        """删除一个视频的全部记录"""
+        self.conn.execute(
+            'DELETE FROM cue_tokens WHERE rowid IN (SELECT id FROM cues WHERE video_id = ?)',
+            (video_id,)
+        )
+        self.conn.execute('DELETE FROM cues WHERE video_id = ?', (video_id,))
+        self.conn.execute('DELETE FROM videos WHERE video_id = ?', (video_id,))
+
+    def search(self, query, limit=20):
+        """搜索短语，返回 [{'video_id', 'start_ms', 'end_ms', 'text'}, ...]"""
+        terms = _query_terms(query)
+        if not terms:
+            return []
+        phrase = _normalize(query)
+        cursor = self.conn.execute(
+            'SELECT cues.video_id, cues.start_ms, cues.end_ms, cues.text '
+            'FROM cue_tokens JOIN cues ON cues.id = cue_tokens.rowid '
+            'WHERE cue_tokens MATCH ?',
+            (' AND '.join(terms),)
+        )
+        hits = []
+        for video_id, start_ms, end_ms, text in cursor:
+            # 索引只保证包含所有词，这里核对短语是否连续出现
+            if phrase not in _normalize(text):
+                continue
+            hits.append({'video_id': video_id, 'start_ms': start_ms, 'end_ms': end_ms, 'text': text})
+            if len(hits) >= limit:
+                break
+        return hits
+
+
+def main():
+    parser = argparse.ArgumentParser(description="输出目录字幕全文索引")
+    parser.add_argument("--dir", "-d", default='out', help="字幕输出目录")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser("update", help="增量更新索引")
+    search_parser = subparsers.add_parser("search", help="搜索短语")
+    search_parser.add_argument("query", help="要搜索的短语")
+    search_parser.add_argument("--limit", "-n", type=int, default=20, help="最多返回条数")
+    args = parser.parse_args()
+
+    with TranscriptIndex(os.path.join(args.dir, INDEX_FILENAME)) as index:
+        if args.command == 'update':
+            start = time.perf_counter()
+            stats = index.update(args.dir)
+            print(f"更新 {stats['added']} 个视频，删除 {stats['removed']} 个视频，"
+                  f"耗时 {time.perf_counter() - start:.2f}秒")
+        else:
+            start = time.perf_counter()
+            hits = index.search(args.query, args.limit)
+            elapsed = (time.perf_counter() - start) * 1000
+            for hit in hits:
+                position = format_srt_time(hit['start_ms']) if hit['start_ms'] is not None else '--:--:--,---'
+                print(f"{hit['video_id']}  {position}  {hit['text']}")
+            print(f"\n共 {len(hits)} 条结果，耗时 {elapsed:.1f}毫秒")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,24 +1,92 @@
 import yt_dlp
+import argparse
+import gzip
+import json
 import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from urllib.parse import urlsplit
 from subtitle_converter import SubtitleConverter
+from subtitle_track import SubtitleTrack
 from youtube_comments_extractor import YouTubeCommentsExtractor
+from comment_table import stream_top_threads
+# 共享模块（如 info_cache）位于仓库根目录
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from info_cache import info_cache
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# 合并输出每次写入的块大小
+WRITE_BUFFER_SIZE = 1024 * 1024
+_COMPRESS_SUFFIXES = {'gzip': '.gz', 'zstd': '.zst'}
+
+
+def _open_report(output_file, compress=None):
+    """以二进制方式打开合并输出文件，compress 为 None、'gzip' 或 'zstd'"""
+    if compress == 'gzip':
+        return gzip.open(output_file, 'wb', compresslevel=6)
+    if compress == 'zstd':
+        if zstandard is None:
+            raise RuntimeError("zstd 压缩需要安装 zstandard: pip install zstandard")
+        return zstandard.open(output_file, 'wb')
+    return open(output_file, 'wb')
+
+
+class _ChunkWriter:
+    """攒够一大块文本再编码写入，减少小块写入的次数"""
+
+    def __init__(self, raw, chunk_size=WRITE_BUFFER_SIZE):
+        self.raw = raw
+        self.chunk_size = chunk_size
+        self._parts = []
+        self._size = 0
+
+    def write(self, text):
+        self._parts.append(text)
+        self._size += len(text)
+        if self._size >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        if self._parts:
+            self.raw.write(''.join(self._parts).encode('utf-8'))
+            self._parts = []
+            self._size = 0
+
+
+def _iter_comments(comments):
+    """逐条读取评论结果中的评论：流式结果读取 JSONL 文件，否则遍历评论列表（CommentTable）"""
+    if comments.get('jsonl_file'):
+        with open(comments['jsonl_file'], 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    else:
+        yield from comments.get('comments') or ()
+
 
 class SubtitleExtractor:
-    def __init__(self):
+    def __init__(self, output_dir='out', timestamp=None, compress=None):
         self.ydl_opts = {
             'writesubtitles': True,
             'writeautomaticsub': True,
-            'subtitlesformat': 'srt',
+            'subtitlesformat': 'srt/vtt/best',  # 优先选择可以直接解析的格式
             'skip_download': True,  # 只下载字幕，不下载视频
             'quiet': True,
             'no_warnings': True
         }
-        self.timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        self.timestamp = timestamp or datetime.now().strftime('%Y%m%d_%H%M%S')
         self.converter = SubtitleConverter()
-        self.comments_extractor = YouTubeCommentsExtractor(self.timestamp)  # 添加评论提取器
+        self.compress = compress  # 合并输出的压缩方式: None、'gzip' 或 'zstd'
+        self.comments_extractor = YouTubeCommentsExtractor(self.timestamp, output_dir)  # 添加评论提取器
         # 创建输出目录
-        self.output_dir = 'out'
+        self.output_dir = output_dir
         if not os.path.exists(self.output_dir):
             os.makedirs(self.output_dir)
     
@@ -33,8 +101,8 @@ class SubtitleExtractor:
         """检查视频支持情况和字幕信息"""
         try:
             with yt_dlp.YoutubeDL(self.ydl_opts) as ydl:
-                # 一次性获取所有信息
-                info = ydl.extract_info(video_url, download=False)
+                # 一次性获取所有信息，缓存中的信息未过期时不再解析页面
+                info = info_cache.extract_info(ydl, video_url, require=('formats',))
                 
                 # 获取字幕信息
                 has_manual_subs = info.get('subtitles', {})
@@ -49,6 +117,7 @@ class SubtitleExtractor:
                     'webpage_url': info.get('webpage_url', ''),
                     'manual_subtitles': list(has_manual_subs.keys()) if has_manual_subs else [],
                     'auto_subtitles': list(has_auto_subs.keys()) if has_auto_subs else [],
+                    'info': info,  # 完整信息，后续下载字幕时直接复用，不再重新解析页面
                     'error': None
                 }
                 
@@ -88,38 +157,64 @@ class SubtitleExtractor:
         else:
             return f"{int(seconds)}秒"
     
-    def save_combined_output(self, video_info, subtitle_text, comments):
-        """保存合并的字幕和评论信息"""
+    def save_combined_output(self, video_info, pure_text_file, comments, top_threads=10):
+        """保存合并的字幕和评论信息
+        
+        字幕从纯文本文件、评论从 JSONL 文件（或 CommentTable）逐块读取后写出，不在内存中拼接完整内容。
+        top_threads 为列出的热门评论串数量。
+        """
         output_file = os.path.join(self.output_dir, f"{video_info['id']}_完整内容_{self.timestamp}.txt")
+        output_file += _COMPRESS_SUFFIXES.get(self.compress, '')
         
         try:
-            with open(output_file, 'w', encoding='utf-8') as f:
+            with _open_report(output_file, self.compress) as raw:
+                f = _ChunkWriter(raw)
                 # 写入字幕内容
-                if subtitle_text:
+                if pure_text_file and os.path.getsize(pure_text_file):
                     f.write("=" * 50 + "\n")
                     f.write("字幕内容\n")
                     f.write("=" * 50 + "\n")
-                    f.write(subtitle_text + "\n\n")
+                    with open(pure_text_file, 'r', encoding='utf-8') as text_f:
+                        for chunk in iter(lambda: text_f.read(WRITE_BUFFER_SIZE), ''):
+                            f.write(chunk)
+                    f.write("\n\n")
                 
                 # 写入评论信息
                 if comments:
                     f.write("评论统计:\n")
                     f.write(f"评论总数: {comments.get('comments_count', 0)}\n\n")
                 
+                # 写入热门评论串
+                if top_threads and comments and comments.get('comments_count'):
+                    f.write("=" * 50 + "\n")
+                    f.write(f"热门评论串 (前{top_threads}个)\n")
+                    f.write("=" * 50 + "\n")
+                    for engagement, comment, replies in stream_top_threads(_iter_comments(comments), top_threads):
+                        parts = [f"[互动 {engagement}] {comment['author']} ({comment['time']}): {comment['text']}\n"]
+                        for depth, reply in replies:
+                            parts.append(f"{'    ' * depth}↳ {reply['author']} (点赞 {reply['like_count']}): {reply['text']}\n")
+                        parts.append("-" * 50 + "\n")
+                        f.write(''.join(parts))
+                    f.write("\n")
+                
                 # 写入评论内容
-                if comments and 'comments' in comments:
+                if comments and ('comments' in comments or 'jsonl_file' in comments):
                     f.write("=" * 50 + "\n")
                     f.write("评论内容\n")
                     f.write("=" * 50 + "\n")
-                    for comment in comments['comments']:
-                        f.write(f"作者: {comment['author']}\n")
-                        f.write(f"时间: {comment['time']}\n")
-                        f.write(f"内容: {comment['text']}\n")
+                    for comment in _iter_comments(comments):
+                        parts = [
+                            f"作者: {comment['author']}\n"
+                            f"时间: {comment['time']}\n"
+                            f"内容: {comment['text']}\n"
+                        ]
                         if comment.get('like_count'):
-                            f.write(f"点赞: {comment['like_count']}\n")
+                            parts.append(f"点赞: {comment['like_count']}\n")
                         if comment.get('reply_count'):
-                            f.write(f"回复数: {comment['reply_count']}\n")
-                        f.write("-" * 50 + "\n")
+                            parts.append(f"回复数: {comment['reply_count']}\n")
+                        parts.append("-" * 50 + "\n")
+                        f.write(''.join(parts))
+                f.flush()
             
             return output_file
         except Exception as e:
@@ -128,6 +223,15 @@ class SubtitleExtractor:
     
     def extract_subtitles(self, video_url):
         """提取视频字幕和评论"""
+        # 评论和字幕互不依赖，评论放到后台线程与字幕处理同时获取
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            print("\n开始获取评论...")
+            # 评论逐条写入 JSONL 文件，合并输出时再从文件读取
+            comments_future = pool.submit(self.comments_extractor.extract_comments, video_url, stream=True)
+            return self._extract_with_comments(video_url, comments_future)
+    
+    def _extract_with_comments(self, video_url, comments_future):
+        """提取字幕，等待后台评论获取完成后合并输出"""
         try:
             # 一次性检查视频支持和字幕信息
             video_info = self.check_video(video_url)
@@ -158,65 +262,46 @@ class SubtitleExtractor:
                         lang_code = code
                         break
                 
-                self.ydl_opts['subtitleslangs'] = [lang_code]
-                
-                # 下载字幕
-                with yt_dlp.YoutubeDL(self.ydl_opts) as ydl:
-                    ydl.download([video_url])
+                # 在内存中获取字幕内容，不经过当前目录中的临时文件
+                subtitle_content = self._download_subtitle(video_info['info'], lang_code)
                 print("\n下载字幕结束，开始本地处理")
-
-                # 查找并处理字幕文件
-                subtitle_file = self._find_subtitle_file()
-                if subtitle_file:
-                    # 读取原始字幕
-                    with open(subtitle_file, 'r', encoding='utf-8') as f:
-                        subtitle_content = f.read()
-                    
-                    # 保存原始字幕和纯文本字幕
+                
+                if subtitle_content:
+                    # 只解析一次，原始字幕和纯文本一起写出
+                    track = SubtitleTrack.from_string(subtitle_content, self.converter)
                     original_file = self.save_file(subtitle_content, 
                                                 f"{video_info['id']}_原始字幕", 
                                                 '.srt')
-                    
-                    # 使用字幕转换器提取纯文本
-                    pure_text = self.converter.extract_pure_text(original_file)
-                    if pure_text['success']:
-                        # 删除临时文件
-                        os.remove(subtitle_file)
-                        result['subtitles'] = {
-                            'original': original_file,
-                            'pure_text': pure_text['output_file']
-                        }
-                        print(f"\n字幕已保存:")
-                        print(f"原始字幕: {original_file}")
-                        print(f"纯文本字幕: {pure_text['output_file']}")
+                    pure_text_file = os.path.join(self.output_dir,
+                                                  f"{video_info['id']}_纯文本_{self.timestamp}.txt")
+                    self.converter.write_pure_text(track.iter_text(), pure_text_file)
+                    result['subtitles'] = {
+                        'original': original_file,
+                        'pure_text': pure_text_file,
+                        'track': track
+                    }
+                    print(f"\n字幕已保存:")
+                    print(f"原始字幕: {original_file}")
+                    print(f"纯文本字幕: {pure_text_file}")
                 else:
-                    print("\n无法找到下载的字幕文件")
+                    print("\n无法获取字幕内容")
             
-            # 读取纯文本字幕内容
-            subtitle_text = None
-            if result['subtitles'] and 'pure_text' in result['subtitles']:
-                try:
-                    with open(result['subtitles']['pure_text'], 'r', encoding='utf-8') as f:
-                        subtitle_text = f.read()
-                except Exception as e:
-                    print(f"读取字幕文件时发生错误: {str(e)}")
-            
-            # 获取评论
-            print("\n开始获取评论...")
-            comments = self.comments_extractor.extract_comments(video_url)
+            # 等待评论获取完成
+            comments = comments_future.result()
             if comments:
                 result['comments'] = comments
                 print(f"\n评论已保存:")
                 print(f"文本文件: {comments['txt_file']}")
-                print(f"JSON文件: {comments['json_file']}")
+                print(f"JSON文件: {comments.get('json_file') or comments['jsonl_file']}")
                 print(f"评论数量: {comments['comments_count']}")
             else:
                 print("\n无法获取评论")
             
             # 合并输出
-            if subtitle_text or comments:
+            if result['subtitles'] or comments:
                 print("\n正在生成完整内容文件...")
-                combined_file = self.save_combined_output(video_info, subtitle_text, comments)
+                pure_text_file = result['subtitles']['pure_text'] if result['subtitles'] else None
+                combined_file = self.save_combined_output(video_info, pure_text_file, comments)
                 if combined_file:
                     result['combined'] = combined_file
                     print(f"完整内容已保存到: {combined_file}")
@@ -240,15 +325,118 @@ class SubtitleExtractor:
         print("手动字幕:", ', '.join(info['manual_subtitles']) if info['manual_subtitles'] else "无")
         print("自动字幕:", ', '.join(info['auto_subtitles']) if info['auto_subtitles'] else "无")
     
-    def _find_subtitle_file(self):
-        """查找下载的字幕文件"""
-        for file in os.listdir():
-            if file.endswith('.srt') or file.endswith('.vtt'):
-                return file
-        return None
+    def _download_subtitle(self, info, lang_code):
+        """根据已获取的视频信息直接下载字幕，返回字幕内容"""
+        ydl_opts = dict(self.ydl_opts)
+        if lang_code:
+            ydl_opts['subtitleslangs'] = [lang_code]
+        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            requested = ydl.process_subtitles(info['id'], info.get('subtitles'), info.get('automatic_captions'))
+            if not requested:
+                return None
+            subtitle = requested.get(lang_code) or next(iter(requested.values()))
+            # 部分提取器直接提供字幕内容
+            if subtitle.get('data') is not None:
+                return subtitle['data']
+            request = yt_dlp.networking.Request(subtitle['url'], headers=subtitle.get('http_headers') or {})
+            with ydl.urlopen(request) as response:
+                return response.read().decode('utf-8', 'replace')
+
+def read_urls(source):
+    """从文件读取URL列表，source 为 '-' 时从标准输入读取；忽略空行和 # 开头的注释"""
+    f = sys.stdin if source == '-' else open(source, 'r', encoding='utf-8')
+    try:
+        return [line.strip() for line in f if line.strip() and not line.strip().startswith('#')]
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+
+def _host_of(url):
+    """URL 的主机名，用于按站点限制并发"""
+    host = urlsplit(url).hostname or ''
+    return host[4:] if host.startswith('www.') else host
+
+
+def extract_batch(urls, workers=8, per_host=4, output_root='out', extractor_class=None, compress=None):
+    """并发处理多个视频
+    
+    每个工作线程使用独立的 SubtitleExtractor、输出目录和时间戳，
+    同一站点同时进行的任务数不超过 per_host。结果按输入顺序返回。
+    """
+    extractor_class = extractor_class or SubtitleExtractor
+    batch_dir = os.path.join(output_root, f"batch_{datetime.now().strftime('%Y%m%d_%H%M%S')}")
+    local = threading.local()
+    lock = threading.Lock()
+    worker_count = [0]
+    host_limits = {}
+
+    def get_extractor():
+        if not hasattr(local, 'extractor'):
+            with lock:
+                worker_count[0] += 1
+                worker_dir = os.path.join(batch_dir, f"worker_{worker_count[0]:02d}")
+            if compress:
+                local.extractor = extractor_class(output_dir=worker_dir, compress=compress)
+            else:
+                local.extractor = extractor_class(output_dir=worker_dir)
+        return local.extractor
+
+    def host_limit(url):
+        host = _host_of(url)
+        with lock:
+            if host not in host_limits:
+                host_limits[host] = threading.Semaphore(per_host)
+            return host_limits[host]
+
+    def run(url):
+        start = time.perf_counter()
+        with host_limit(url):
+            try:
+                result = get_extractor().extract_subtitles(url)
+                error = None
+            except Exception as e:
+                result, error = None, str(e)
+        return {'url': url, 'result': result, 'error': error, 'elapsed': time.perf_counter() - start}
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(run, urls))
+
+
+def run_batch(source, workers, per_host, extractor_class=None, compress=None):
+    """批量模式入口：读取URL列表并打印处理结果"""
+    urls = read_urls(source)
+    print(f"共 {len(urls)} 个URL，{workers} 个工作线程，每个站点最多 {per_host} 个并发")
+    start = time.perf_counter()
+    results = extract_batch(urls, workers, per_host, extractor_class=extractor_class, compress=compress)
+    succeeded = 0
+    for item in results:
+        result = item['result']
+        if result and (result['subtitles'] or result['comments']):
+            succeeded += 1
+        else:
+            print(f"\n失败: {item['url']} {item['error'] or ''}")
+    print(f"\n完成 {succeeded}/{len(results)} 个视频，耗时 {time.perf_counter() - start:.1f}秒")
+
+
+def parse_args(compress=True):
+    """解析命令行参数，compress 为 False 时不提供 --compress（提取器不支持压缩输出）"""
+    parser = argparse.ArgumentParser(description="视频字幕和评论提取")
+    parser.add_argument("--batch", "-b", metavar="FILE", help="批量模式：从文件读取URL列表，- 表示标准输入")
+    parser.add_argument("--workers", "-w", type=int, default=8, help="工作线程数")
+    parser.add_argument("--per-host", type=int, default=4, help="每个站点的最大并发数")
+    if compress:
+        parser.add_argument("--compress", choices=['gzip', 'zstd'], help="压缩合并输出文件")
+    return parser.parse_args()
+
 
 def main():
-    extractor = SubtitleExtractor()
+    args = parse_args()
+    if args.batch:
+        run_batch(args.batch, args.workers, args.per_host, compress=args.compress)
+        return
+    
+    extractor = SubtitleExtractor(compress=args.compress)
     while True:
         video_url = input("\n请输入视频URL (输入q退出): ").strip()
         
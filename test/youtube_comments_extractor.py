@@ -1,13 +1,20 @@
 import yt_dlp
 import os
+import sys
 from datetime import datetime
 import json
+from contextlib import nullcontext
+# 共享模块（如 info_cache）位于仓库根目录
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from info_cache import info_cache
+from comment_store import CommentStore, STORE_DIRNAME
+from comment_table import CommentTable, format_timestamp
 
 class YouTubeCommentsExtractor:
-    def __init__(self, timestamp):
+    def __init__(self, timestamp=None, output_dir='out'):
         # 创建输出目录
-        self.output_dir = 'out'
-        self.timestamp = timestamp
+        self.output_dir = output_dir
+        self.timestamp = timestamp or datetime.now().strftime('%Y%m%d_%H%M%S')
         if not os.path.exists(self.output_dir):
             os.makedirs(self.output_dir)
         
@@ -26,44 +33,90 @@ class YouTubeCommentsExtractor:
         
         with open(output_file, 'w', encoding='utf-8') as f:
             for comment in comments:
-                # 写入评论信息
-                f.write(f"作者: {comment['author']}\n")
-                f.write(f"时间: {comment['time']}\n")
-                f.write(f"内容: {comment['text']}\n")
-                if comment.get('like_count'):
-                    f.write(f"点赞: {comment['like_count']}\n")
-                if comment.get('reply_count'):
-                    f.write(f"回复数: {comment['reply_count']}\n")
-                f.write("-" * 50 + "\n")
+                self._write_comment_text(f, comment)
         
         return output_file
     
+    def _write_comment_text(self, f, comment):
+        """写入一条评论的文本格式"""
+        f.write(f"作者: {comment['author']}\n")
+        f.write(f"时间: {comment['time']}\n")
+        f.write(f"内容: {comment['text']}\n")
+        if comment.get('like_count'):
+            f.write(f"点赞: {comment['like_count']}\n")
+        if comment.get('reply_count'):
+            f.write(f"回复数: {comment['reply_count']}\n")
+        f.write("-" * 50 + "\n")
+    
+    def stream_comments(self, raw_comments, filename, write_text=True):
+        """逐条转换评论并立即写入 JSONL 文件（可选同时写入文本文件），不保留评论列表"""
+        jsonl_file = os.path.join(self.output_dir, f"{filename}_评论_{self.timestamp}.jsonl")
+        txt_file = os.path.join(self.output_dir, f"{filename}_评论_{self.timestamp}.txt") if write_text else None
+        
+        comments_count = 0
+        with open(jsonl_file, 'w', encoding='utf-8', buffering=1024 * 1024) as jsonl_f, \
+                (open(txt_file, 'w', encoding='utf-8', buffering=1024 * 1024) if txt_file else nullcontext()) as txt_f:
+            for comment in raw_comments:
+                comment_data = self._convert_comment(comment)
+                jsonl_f.write(json.dumps(comment_data, ensure_ascii=False) + '\n')
+                if txt_f:
+                    self._write_comment_text(txt_f, comment_data)
+                comments_count += 1
+        
+        if not comments_count:
+            for output_file in (jsonl_file, txt_file):
+                if output_file:
+                    os.remove(output_file)
+            return None
+        
+        return {
+            'txt_file': txt_file,
+            'jsonl_file': jsonl_file,
+            'comments_count': comments_count
+        }
+    
     def save_comments_json(self, comments, filename):
         """保存评论到JSON文件"""
         output_file = os.path.join(self.output_dir, f"{filename}_评论_{self.timestamp}.json")
         
         with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(comments, f, ensure_ascii=False, indent=2)
+            json.dump(list(comments), f, ensure_ascii=False, indent=2)
         
         return output_file
     
     def format_timestamp(self, timestamp):
         """格式化时间戳"""
-        if not timestamp:
-            return "未知时间"
-        try:
-            from datetime import datetime
-            return datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d %H:%M:%S')
-        except:
-            return str(timestamp)
+        return format_timestamp(timestamp)
+    
+    def _convert_comment(self, comment):
+        """将 yt-dlp 返回的评论转换为输出格式"""
+        return {
+            'id': comment.get('id'),
+            'parent': comment.get('parent', 'root'),
+            'author': comment.get('author', '未知作者'),
+            'time': format_timestamp(comment.get('timestamp')),
+            'text': comment.get('text', ''),
+            'like_count': comment.get('like_count', 0),
+            'reply_count': comment.get('reply_count', 0)
+        }
     
-    def extract_comments(self, video_url):
-        """提取视频评论"""
+    def extract_comments(self, video_url, stream=False, write_text=True):
+        """提取视频评论
+        
+        默认返回结果中的 'comments' 为 CommentTable，逐条迭代得到输出格式的字典。
+        stream 为 True 时每条评论转换后直接写入 JSONL 文件（write_text 控制是否同时写入文本文件），
+        返回结果只包含文件路径和评论数量，不包含评论列表。评论由 _iter_comment_entries
+        边获取边写入，内存占用与评论数量无关。
+        """
         try:
             print("\n正在获取视频信息...")
             with yt_dlp.YoutubeDL(self.ydl_opts) as ydl:
-                # 获取视频信息
-                info = ydl.extract_info(video_url, download=False)
+                if stream:
+                    # 不处理信息字典，评论的获取推迟到 _iter_comment_entries 中逐条进行
+                    info = ydl.extract_info(video_url, download=False, process=False)
+                else:
+                    # 获取视频信息（包含评论）。评论不写入缓存，每次重新获取
+                    info = info_cache.extract_info(ydl, video_url, require=('comments',))
                 
                 if not info:
                     print("无法获取视频信息")
@@ -78,18 +131,16 @@ class YouTubeCommentsExtractor:
                 
                 # 获取评论
                 print("\n正在获取评论...")
-                comments = []
+                if stream:
+                    result = self.stream_comments(self._iter_comment_entries(info), video_id, write_text)
+                    if not result:
+                        print("未找到任何评论")
+                    else:
+                        print(f"\n共获取到 {result['comments_count']} 条评论")
+                    return result
                 
-                if 'comments' in info:
-                    for comment in info['comments']:
-                        comment_data = {
-                            'author': comment.get('author', '未知作者'),
-                            'time': self.format_timestamp(comment.get('timestamp')),
-                            'text': comment.get('text', ''),
-                            'like_count': comment.get('like_count', 0),
-                            'reply_count': comment.get('reply_count', 0)
-                        }
-                        comments.append(comment_data)
+                # 列式保存，时间在写入文件时才格式化
+                comments = CommentTable.from_comments(info.get('comments') or [])
                 
                 if not comments:
                     print("未找到任何评论")
@@ -112,6 +163,97 @@ class YouTubeCommentsExtractor:
             print(f"获取评论时发生错误: {str(e)}")
             return None
 
+    def _iter_comment_entries(self, info):
+        """逐条生成 yt-dlp 获取的评论
+
+        extract_info(process=False) 返回的信息字典中，评论的获取被推迟到 __post_extractor 中，
+        这里直接取出其中的评论生成器，这样调用方可以边获取边判断并提前停止，不必等待全部评论下载完。
+        这依赖 yt-dlp 的内部实现，取不到生成器时给出警告并退回到一次性获取全部评论。
+        """
+        post_extractor = info.pop('__post_extractor', None)
+        if not post_extractor:
+            yield from info.get('comments') or []
+            return
+        cells = dict(zip(post_extractor.__code__.co_freevars, post_extractor.__closure__ or ()))
+        generator = cells['generator'].cell_contents if 'generator' in cells else None
+        if generator is None:
+            print("警告: 无法逐条获取评论（yt-dlp 内部实现可能已变化），改为一次性获取全部评论，不能提前停止")
+            yield from post_extractor().get('comments') or []
+            return
+        try:
+            yield from generator
+        finally:
+            # 提前停止时关闭生成器，不再请求后续评论页
+            generator.close()
+    
+    def refresh_comments(self, video_url, max_comments=None):
+        """增量刷新评论：只获取上次运行之后的新评论
+        
+        按最新排序获取评论，遇到已衔接的顶层评论（置顶评论除外）即停止，
+        max_comments 限制本次最多获取的新评论数。新评论追加到评论库（输出目录下的 .comment_store），
+        并和 extract_comments(stream=True) 一样写入本次的 JSONL/文本文件。
+        因 max_comments 提前停止时，与上次保存的评论之间可能还有缺口：这次的评论不作为停止位置，
+        下次刷新会跳过它们继续向后获取，直到衔接上为止（返回结果中 'complete' 为 False）。
+        旧评论下新增的回复不会被获取到，需要时请使用 extract_comments 完整获取。
+        """
+        ydl_opts = dict(self.ydl_opts)
+        # 数量限制在下面逐条判断（跳过已保存的评论不计数），不传给 yt-dlp
+        ydl_opts['extractor_args'] = {'youtube': {'comment_sort': ['new']}}
+        
+        try:
+            print("\n正在获取视频信息...")
+            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+                # 评论需要重新获取，不使用缓存
+                info = ydl.extract_info(video_url, download=False, process=False)
+                
+                if not info:
+                    print("无法获取视频信息")
+                    return None
+                
+                video_id = info.get('id', 'unknown')
+                print(f"\n视频信息:")
+                print(f"标题: {info.get('title', 'unknown_video')}")
+                print(f"ID: {video_id}")
+                
+                store = CommentStore(os.path.join(self.output_dir, STORE_DIRNAME))
+                state = store.load_state(video_id)
+                seen_ids = state['seen_ids']
+                incomplete_ids = state['incomplete_ids']
+                
+                print("\n正在获取新评论...")
+                new_comments = []
+                # 遇到已衔接的评论或获取完全部评论时为 True
+                complete = True
+                for comment in self._iter_comment_entries(info):
+                    comment_id = comment.get('id')
+                    if comment_id in seen_ids:
+                        # 回复和置顶评论不按时间排序，遇到已衔接的顶层评论才说明之后都是旧评论
+                        if (comment.get('parent', 'root') == 'root' and not comment.get('is_pinned')
+                                and comment_id not in incomplete_ids):
+                            break
+                        continue
+                    if max_comments and len(new_comments) >= max_comments:
+                        complete = False
+                        break
+                    new_comments.append(comment)
+        
+        except Exception as e:
+            print(f"获取评论时发生错误: {str(e)}")
+            return None
+        
+        store.add(video_id, new_comments, state, complete)
+        if not complete:
+            print(f"\n已达到数量限制 {max_comments}，与上次保存的评论之间可能还有未获取的评论，下次刷新时继续补齐")
+        if not new_comments:
+            print("没有新评论")
+            return {'txt_file': None, 'jsonl_file': None, 'comments_count': 0, 'complete': complete}
+        
+        print(f"\n共获取到 {len(new_comments)} 条新评论")
+        result = self.stream_comments(new_comments, video_id)
+        if result:
+            result['complete'] = complete
+        return result
+
 def main():
     extractor = YouTubeCommentsExtractor()
     
@@ -123,12 +265,18 @@ def main():
             print("程序已退出")
             break
         
-        result = extractor.extract_comments(video_url)
+        if input("是否只获取上次运行之后的新评论？(y/n): ").lower() == 'y':
+            max_comments = input("最多获取评论数 (直接回车不限制): ").strip()
+            result = extractor.refresh_comments(video_url, int(max_comments) if max_comments.isdigit() else None)
+            if result and not result['comments_count']:
+                continue
+        else:
+            result = extractor.extract_comments(video_url)
         
         if result:
             print(f"\n评论已保存:")
             print(f"文本文件: {result['txt_file']}")
-            print(f"JSON文件: {result['json_file']}")
+            print(f"JSON文件: {result.get('json_file') or result['jsonl_file']}")
             print(f"评论数量: {result['comments_count']}")
         else:
             print("\n无法获取评论")